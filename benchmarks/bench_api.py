@@ -0,0 +1,67 @@
+"""
+Compares per-note latency of the batch API endpoints against one call per note.
+
+Usage:
+    PYTHONPATH=. python benchmarks/bench_api.py [--notes 200]
+"""
+import argparse
+import os
+import tempfile
+import time
+from note_app import web, database
+
+def _timed(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+def run(n):
+    db_fd, db_path = tempfile.mkstemp()
+    try:
+        app = web.create_app({'TESTING': True, 'DATABASE': db_path, 'API_MAX_BATCH': max(n, 500)})
+        database.setup_database()
+        user_id = database.create_user("bench", "bench@example.com", "bench")
+        headers = {'Authorization': f'Bearer {database.create_api_token(user_id)}'}
+        client = app.test_client()
+        notes = [{'title': f'Note {i}', 'content': 'Lorem ipsum ' * 50, 'tags': 'bench, api'} for i in range(n)]
+
+        single_ids = []
+        def create_single():
+            for note in notes:
+                r = client.post('/api/v1/notes/batch', headers=headers, json={'notes': [note]})
+                single_ids.extend(r.get_json()['ids'])
+        batch_ids = []
+        def create_batch():
+            r = client.post('/api/v1/notes/batch', headers=headers, json={'notes': notes})
+            batch_ids.extend(r.get_json()['ids'])
+        def fetch_single():
+            for note_id in single_ids:
+                client.get(f'/api/v1/notes/{note_id}', headers=headers)
+        def fetch_batch():
+            client.post('/api/v1/notes/batch/fetch', headers=headers, json={'ids': batch_ids})
+        def fetch_batch_no_content():
+            client.post('/api/v1/notes/batch/fetch?fields=id,title,tags', headers=headers, json={'ids': batch_ids})
+        def delete_single():
+            for note_id in single_ids:
+                client.delete('/api/v1/notes/batch', headers=headers, json={'ids': [note_id]})
+        def delete_batch():
+            client.delete('/api/v1/notes/batch', headers=headers, json={'ids': batch_ids})
+
+        print(f"{'operation':<24}{'single ms/note':>16}{'batch ms/note':>16}{'speedup':>10}")
+        for label, single, batch in [
+            ('create', create_single, create_batch),
+            ('fetch', fetch_single, fetch_batch),
+            ('fetch (no content)', fetch_single, fetch_batch_no_content),
+            ('delete', delete_single, delete_batch),
+        ]:
+            s = _timed(single) / n * 1000
+            b = _timed(batch) / n * 1000
+            print(f"{label:<24}{s:>16.3f}{b:>16.3f}{s / b:>9.1f}x")
+    finally:
+        os.close(db_fd)
+        os.unlink(db_path)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--notes", type=int, default=200, help="Number of notes per run.")
+    run(parser.parse_args().notes)
@@ -0,0 +1,87 @@
+"""
+Measures request latency while an online backup runs.
+
+Seeds a database, then times page reads and note writes through the Flask
+test client with no backup running, during a page-batched snapshot, and
+during a single-step backup that copies the whole file at once.
+
+Usage:
+    PYTHONPATH=. python benchmarks/bench_backup.py [--notes 5000] [--pages 256]
+"""
+import argparse
+import os
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+from note_app import web, database, backup
+
+def _percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+def _measure(client, stop):
+    reads, writes = [], []
+    i = 0
+    while not stop.is_set():
+        start = time.perf_counter()
+        client.get('/')
+        reads.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        client.post('/new', data={'title': f'Bench {i}', 'content': 'Written during backup'})
+        writes.append(time.perf_counter() - start)
+        i += 1
+    return reads, writes
+
+def run(n, pages, pause):
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        _run(tmp_dir, n, pages, pause)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+def _run(tmp_dir, n, pages, pause):
+    db_path = os.path.join(tmp_dir, 'notes.db')
+    app = web.create_app({'TESTING': True, 'DATABASE': db_path})
+    database.setup_database()
+    user_id = database.create_user("bench", "bench@example.com", "bench")
+    database.add_notes([
+        {'title': f'Seed {i}', 'content': f'Seed note {i} ' * 200, 'tags': f'tag{i % 20}'} for i in range(n)
+    ], user_id)
+    print(f"Seeded {n} notes, {os.path.getsize(db_path) / 1024 / 1024:.1f} MiB.")
+
+    client = app.test_client()
+    client.post('/login', data={'username': 'bench', 'password': 'bench'})
+
+    def idle():
+        time.sleep(2)
+    def batched():
+        backup.backup_database(db_path, os.path.join(tmp_dir, 'batched.db'), pages=pages, pause=pause)
+    def single_step():
+        backup.backup_database(db_path, os.path.join(tmp_dir, 'single.db'), pages=-1, pause=0)
+
+    print(f"{'scenario':<22}{'duration s':>11}{'read p50/p95 ms':>20}{'write p50/p95 ms':>20}{'requests':>10}")
+    for label, job in [('no backup', idle), (f'batched ({pages} pages)', batched), ('single step', single_step)]:
+        stop = threading.Event()
+        results = {}
+        worker = threading.Thread(target=lambda: results.update(zip(('reads', 'writes'), _measure(client, stop))))
+        worker.start()
+        start = time.perf_counter()
+        job()
+        duration = time.perf_counter() - start
+        stop.set()
+        worker.join()
+        reads, writes = results['reads'], results['writes']
+        print(f"{label:<22}{duration:>11.2f}"
+              f"{statistics.median(reads) * 1000:>11.1f}/{_percentile(reads, 95) * 1000:<8.1f}"
+              f"{statistics.median(writes) * 1000:>11.1f}/{_percentile(writes, 95) * 1000:<8.1f}"
+              f"{len(reads) + len(writes):>10}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--notes", type=int, default=5000, help="Number of notes to seed.")
+    parser.add_argument("--pages", type=int, default=256, help="Pages per step for the batched backup.")
+    parser.add_argument("--pause", type=float, default=0.005, help="Seconds to sleep between batched steps.")
+    args = parser.parse_args()
+    run(args.notes, args.pages, args.pause)
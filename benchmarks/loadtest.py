@@ -0,0 +1,331 @@
+"""
+Load test for wsgi:app under gunicorn with a multi-user traffic mix.
+
+For every combination of --workers and --threads, the harness seeds a
+fresh database and starts gunicorn on it. It registers and logs in
+--users users, then runs --concurrency client threads for --duration
+seconds, each replaying the weighted --mix of routes. It reports
+latency percentiles, throughput and errors per route, including
+`database is locked` failures found in gunicorn's error log, as JSON.
+
+Usage:
+    PYTHONPATH=. python benchmarks/loadtest.py --workers 1,2,4 --threads 1,4 \\
+        --duration 15 --output loadtest.json
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import re
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+from datetime import datetime
+
+from note_app import database
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_MIX = "index=35,note=30,search=10,tag=10,new=10,edit=5"
+WORDS = "alpha bravo charlie delta echo foxtrot golf hotel india juliet kilo lima mike november oscar".split()
+TAGS = [f"tag{i}" for i in range(10)]
+CATEGORIES = ["Work", "Personal", "Ideas"]
+
+# Gunicorn logs each unhandled exception as "Exception on <path> [<method>]" followed by the traceback.
+_EXCEPTION_RE = re.compile(r"Exception on (\S+) \[(\w+)\]")
+
+def route_of(path):
+    """Maps a request path to the route label used in the report."""
+    path = path.split('?')[0]
+    if path == '/': return 'index'
+    for prefix, label in (('/note/', 'note'), ('/tag/', 'tag'), ('/edit/', 'edit')):
+        if path.startswith(prefix): return label
+    return {'/search': 'search', '/new': 'new', '/login': 'login', '/register': 'register'}.get(path, path)
+
+def parse_mix(spec):
+    mix = {}
+    for part in spec.split(','):
+        name, _, weight = part.partition('=')
+        mix[name.strip()] = float(weight or 1)
+    unknown = set(mix) - {'index', 'note', 'search', 'tag', 'new', 'edit'}
+    if unknown:
+        raise SystemExit(f"Unknown route(s) in --mix: {', '.join(sorted(unknown))}")
+    return mix
+
+def percentile(samples, pct):
+    if not samples: return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+# --- Seeding ---
+
+def seed_notes(db_path, usernames, notes_per_user):
+    """Adds notes for already registered users directly in the database. Returns their ids per user."""
+    database.DB_NAME = db_path
+    rng = random.Random(42)
+    note_ids = {}
+    for username in usernames:
+        user_id = database.get_user_by_username(username)['id']
+        notes = [{
+            'title': f"{rng.choice(WORDS).title()} note {i}",
+            'content': " ".join(rng.choice(WORDS) for _ in range(rng.randint(20, 400))),
+            'category': rng.choice(CATEGORIES),
+            'tags': ", ".join(rng.sample(TAGS, 2)),
+        } for i in range(notes_per_user)]
+        note_ids[username] = database.add_notes(notes, user_id)
+    return note_ids
+
+# --- Client ---
+
+class Client:
+    """One logged-in user. Redirects are not followed, so each sample is one request."""
+
+    def __init__(self, port, username):
+        self.port = port
+        self.username = username
+        self.password = 'password'
+        self.note_ids = []
+        self.cookie = None
+
+    def request(self, method, path, form=None):
+        conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=30)
+        headers = {'Cookie': self.cookie} if self.cookie else {}
+        body = None
+        if form is not None:
+            body = urllib.parse.urlencode(form)
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        try:
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            set_cookie = response.getheader('Set-Cookie')
+            if set_cookie:
+                self.cookie = set_cookie.split(';', 1)[0]
+            return response.status
+        finally:
+            conn.close()
+
+    def register(self):
+        form = {'username': self.username, 'email': f"{self.username}@example.com", 'password': self.password}
+        status = self.request('POST', '/register', form)
+        if status != 302:
+            raise RuntimeError(f"Registration failed for {self.username} (HTTP {status}).")
+
+    def login(self):
+        self.cookie = None
+        status = self.request('POST', '/login', {'username': self.username, 'password': self.password})
+        if status != 302 or not self.cookie:
+            raise RuntimeError(f"Login failed for {self.username} (HTTP {status}).")
+
+    def next_request(self, route, rng):
+        """Returns (method, path, form) for one request of the given route."""
+        note_id = rng.choice(self.note_ids)
+        if route == 'index':
+            return 'GET', '/', None
+        if route == 'note':
+            return 'GET', f'/note/{note_id}', None
+        if route == 'search':
+            return 'GET', f'/search?q={rng.choice(WORDS)}', None
+        if route == 'tag':
+            return 'GET', f'/tag/{rng.choice(TAGS)}', None
+        form = {
+            'title': f"{rng.choice(WORDS).title()} load note",
+            'content': " ".join(rng.choice(WORDS) for _ in range(rng.randint(20, 200))),
+            'category': rng.choice(CATEGORIES),
+            'tags': ", ".join(rng.sample(TAGS, 2)),
+        }
+        if route == 'new':
+            return 'POST', '/new', form
+        return 'POST', f'/edit/{note_id}', form
+
+def _client_loop(client, mix, deadline, seed_value, samples, lock):
+    rng = random.Random(seed_value)
+    routes, weights = list(mix), list(mix.values())
+    local = []
+    while time.perf_counter() < deadline:
+        route = rng.choices(routes, weights)[0]
+        method, path, form = client.next_request(route, rng)
+        start = time.perf_counter()
+        try:
+            status = client.request(method, path, form)
+        except OSError:
+            status = None
+        local.append((route, time.perf_counter() - start, status))
+    with lock:
+        samples.extend(local)
+
+# --- Server ---
+
+def start_server(db_path, port, workers, threads, log_path):
+    env = dict(os.environ, DATABASE=db_path, SECRET_KEY='loadtest')
+    log = open(log_path, 'w')
+    proc = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '--bind', f'127.0.0.1:{port}', '--workers', str(workers),
+         '--threads', str(threads), '--error-logfile', '-', 'wsgi:app'],
+        cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT,
+    )
+    for _ in range(100):
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            conn.request('GET', '/login')
+            conn.getresponse().read()
+            conn.close()
+            return proc, log
+        except OSError:
+            if proc.poll() is not None:
+                break
+            time.sleep(0.1)
+    proc.terminate()
+    log.close()
+    with open(log_path, encoding='utf-8', errors='replace') as f:
+        tail = f.read()[-2000:]
+    raise RuntimeError(f"gunicorn did not start:\n{tail}")
+
+def locked_errors(log_path):
+    """Counts `database is locked` tracebacks per route in a gunicorn error log."""
+    with open(log_path, encoding='utf-8', errors='replace') as f:
+        text = f.read()
+    counts = {}
+    blocks = _EXCEPTION_RE.split(text)
+    # split() yields [preamble, path, method, traceback, path, method, traceback, ...]
+    for i in range(1, len(blocks) - 2, 3):
+        if 'database is locked' in blocks[i + 2]:
+            route = route_of(blocks[i])
+            counts[route] = counts.get(route, 0) + 1
+    return counts
+
+# --- Runner ---
+
+def run_once(args, mix, workers, threads):
+    tmp_dir = tempfile.mkdtemp(prefix='selfnote-load-')
+    try:
+        db_path = os.path.join(tmp_dir, 'notes.db')
+        log_path = os.path.join(tmp_dir, 'gunicorn.log')
+        database.DB_NAME = db_path
+        database.setup_database()
+        port = _free_port()
+        proc, log = start_server(db_path, port, workers, threads, log_path)
+        try:
+            usernames = [f"load{u}" for u in range(args.users)]
+            for username in usernames:
+                Client(port, username).register()
+            note_ids = seed_notes(db_path, usernames, args.notes)
+            clients = [Client(port, usernames[i % len(usernames)]) for i in range(args.concurrency)]
+            for client in clients:
+                client.note_ids = note_ids[client.username]
+                client.login()
+            samples, lock = [], threading.Lock()
+            start = time.perf_counter()
+            deadline = start + args.duration
+            pool = [
+                threading.Thread(target=_client_loop, args=(client, mix, deadline, i, samples, lock))
+                for i, client in enumerate(clients)
+            ]
+            for t in pool: t.start()
+            for t in pool: t.join()
+            elapsed = time.perf_counter() - start
+        finally:
+            proc.terminate()
+            proc.wait(timeout=30)
+            log.close()
+        locked = locked_errors(log_path)
+        if args.keep_logs:
+            shutil.copyfile(log_path, f"gunicorn-w{workers}-t{threads}.log")
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    routes = {}
+    for route in mix:
+        latencies = [lat for r, lat, _ in samples if r == route]
+        errors = sum(1 for r, _, status in samples if r == route and (status is None or status >= 400))
+        routes[route] = {
+            'requests': len(latencies),
+            'errors': errors,
+            'error_rate': errors / len(latencies) if latencies else 0.0,
+            'db_locked': locked.get(route, 0),
+            'throughput_rps': len(latencies) / elapsed,
+            'p50_ms': _ms(percentile(latencies, 50)),
+            'p95_ms': _ms(percentile(latencies, 95)),
+            'p99_ms': _ms(percentile(latencies, 99)),
+        }
+    all_latencies = [lat for _, lat, _ in samples]
+    errors = sum(r['errors'] for r in routes.values())
+    return {
+        'workers': workers,
+        'threads': threads,
+        'duration_s': round(elapsed, 3),
+        'requests': len(samples),
+        'throughput_rps': len(samples) / elapsed,
+        'errors': errors,
+        'error_rate': errors / len(samples) if samples else 0.0,
+        'db_locked': sum(locked.values()),
+        'p50_ms': _ms(percentile(all_latencies, 50)),
+        'p95_ms': _ms(percentile(all_latencies, 95)),
+        'p99_ms': _ms(percentile(all_latencies, 99)),
+        'routes': routes,
+    }
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 2)
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+def _print_summary(run, out):
+    print(f"\nworkers={run['workers']} threads={run['threads']}: {run['throughput_rps']:.1f} req/s, "
+          f"errors {run['error_rate']:.1%}, database locked {run['db_locked']}", file=out)
+    print(f"  {'route':<8}{'req':>7}{'rps':>8}{'p50':>9}{'p95':>9}{'p99':>9}{'err':>7}{'locked':>8}", file=out)
+    for route, r in run['routes'].items():
+        print(f"  {route:<8}{r['requests']:>7}{r['throughput_rps']:>8.1f}"
+              f"{r['p50_ms'] or 0:>9.1f}{r['p95_ms'] or 0:>9.1f}{r['p99_ms'] or 0:>9.1f}"
+              f"{r['errors']:>7}{r['db_locked']:>8}", file=out)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", default="1,2", help="Comma-separated gunicorn worker counts to try.")
+    parser.add_argument("--threads", default="1", help="Comma-separated gunicorn thread counts to try.")
+    parser.add_argument("--users", type=int, default=5, help="Users to register and log in.")
+    parser.add_argument("--notes", type=int, default=200, help="Notes seeded per user.")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent client threads.")
+    parser.add_argument("--duration", type=float, default=10, help="Seconds to run each configuration.")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"Route weights (default: {DEFAULT_MIX}).")
+    parser.add_argument("--output", help="Write the JSON report to this file instead of stdout.")
+    parser.add_argument("--keep-logs", action="store_true", help="Copy each gunicorn log to the current directory.")
+    args = parser.parse_args(argv)
+    mix = parse_mix(args.mix)
+
+    report = {
+        'started': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        'commit': _git_commit(),
+        'params': {k: v for k, v in vars(args).items() if k not in ('output', 'keep_logs')},
+        'runs': [],
+    }
+    for workers in [int(w) for w in args.workers.split(',')]:
+        for threads in [int(t) for t in args.threads.split(',')]:
+            run = run_once(args, mix, workers, threads)
+            report['runs'].append(run)
+            _print_summary(run, sys.stderr)
+
+    payload = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(payload + "\n")
+    else:
+        print(payload)
+
+if __name__ == '__main__':
+    main()
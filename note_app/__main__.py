@@ -9,8 +9,22 @@ def main():
     if len(sys.argv) > 1 and sys.argv[1] == 'web':
         # Create the Flask app using the factory
         app = web.create_app()
+        from . import database
+        database.setup_database()
         # Run the app in debug mode for development
         app.run(debug=True, port=5001)
+    elif len(sys.argv) > 1 and sys.argv[1] == 'migrate':
+        from . import cli
+        cli.migrate_main(sys.argv[2:])
+    elif len(sys.argv) > 1 and sys.argv[1] == 'compact':
+        from . import cli
+        cli.compact_main(sys.argv[2:])
+    elif len(sys.argv) > 1 and sys.argv[1] == 'backup':
+        from . import backup
+        backup.main(sys.argv[2:])
+    elif len(sys.argv) > 1 and sys.argv[1] == 'assets':
+        from . import assets
+        assets.main(sys.argv[2:])
     else:
         from . import cli
         cli.main()
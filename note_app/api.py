@@ -0,0 +1,117 @@
+import json
+from functools import wraps
+from flask import Blueprint, current_app, request, g
+from . import database
+
+bp = Blueprint('api', __name__, url_prefix='/api/v1')
+
+def _json(payload, status=200):
+    """Serializes without whitespace; batch responses can get large."""
+    body = json.dumps(payload, separators=(',', ':'), ensure_ascii=False)
+    return current_app.response_class(body, status=status, mimetype='application/json')
+
+def _error(message, status=400):
+    return _json({'error': message}, status)
+
+def token_required(f):
+    """Authenticates with an `Authorization: Bearer <token>` header instead of the session cookie."""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        auth = request.headers.get('Authorization', '')
+        scheme, _, token = auth.partition(' ')
+        user = database.get_user_by_token(token.strip()) if scheme.lower() == 'bearer' else None
+        if not user:
+            return _error("Invalid or missing API token.", 401)
+        g.api_user = user
+        return f(*args, **kwargs)
+    return decorated_function
+
+def _parse_fields():
+    """Reads the `fields` query parameter, e.g. `?fields=id,title,tags`."""
+    raw = request.args.get('fields')
+    if not raw:
+        return None
+    fields = [f.strip() for f in raw.split(',') if f.strip()]
+    unknown = [f for f in fields if f not in database.NOTE_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown field(s): {', '.join(unknown)}")
+    return fields
+
+def _batch_items(key):
+    """Returns the list under `key` in the JSON body, enforcing API_MAX_BATCH."""
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or not isinstance(data.get(key), list):
+        raise ValueError(f"Request body must be a JSON object with a '{key}' list.")
+    items = data[key]
+    if len(items) > current_app.config['API_MAX_BATCH']:
+        raise ValueError(f"Batch too large (max {current_app.config['API_MAX_BATCH']}).")
+    return items
+
+def _batch_ids():
+    ids = _batch_items('ids')
+    if not all(isinstance(i, str) for i in ids):
+        raise ValueError("'ids' must be a list of note UUID strings.")
+    return ids
+
+def _check_note(note, partial=False):
+    """
+    Rejects notes whose fields have the wrong type. `title` and `content` must
+    be non-empty strings (and may be left out when `partial`), `category` and
+    `tags` strings or null.
+    """
+    for key in ('title', 'content'):
+        if key not in note and partial:
+            continue
+        if not isinstance(note.get(key), str) or not note[key]:
+            raise ValueError(f"'{key}' must be a non-empty string.")
+    for key in ('category', 'tags'):
+        if note.get(key) is not None and not isinstance(note[key], str):
+            raise ValueError(f"'{key}' must be a string, e.g. \"tags\": \"a, b\".")
+
+@bp.errorhandler(ValueError)
+def handle_value_error(e):
+    return _error(str(e), 400)
+
+@bp.route('/notes/<uuid:note_id>')
+@token_required
+def get_note(note_id):
+    notes = database.get_notes([str(note_id)], g.api_user['id'], fields=_parse_fields())
+    if not notes:
+        return _error("Note not found.", 404)
+    return _json(notes[0])
+
+@bp.route('/notes/batch/fetch', methods=['POST'])
+@token_required
+def batch_fetch():
+    ids = _batch_ids()
+    notes = database.get_notes(ids, g.api_user['id'], fields=_parse_fields())
+    return _json({'notes': notes})
+
+@bp.route('/notes/batch', methods=['POST'])
+@token_required
+def batch_create():
+    notes = _batch_items('notes')
+    for note in notes:
+        if not isinstance(note, dict):
+            raise ValueError("Each note must be a JSON object.")
+        _check_note(note)
+    note_ids = database.add_notes(notes, g.api_user['id'])
+    return _json({'ids': note_ids}, 201)
+
+@bp.route('/notes/batch', methods=['PATCH'])
+@token_required
+def batch_update():
+    notes = _batch_items('notes')
+    for note in notes:
+        if not isinstance(note, dict) or not isinstance(note.get('id'), str):
+            raise ValueError("Each note requires an id.")
+        _check_note(note, partial=True)
+    updated = database.update_notes(notes, g.api_user['id'])
+    return _json({'updated': updated})
+
+@bp.route('/notes/batch', methods=['DELETE'])
+@token_required
+def batch_delete():
+    ids = _batch_ids()
+    deleted = database.delete_notes(ids, g.api_user['id'])
+    return _json({'deleted': deleted})
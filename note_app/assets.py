@@ -0,0 +1,138 @@
+"""
+Build-time static asset pipeline.
+
+`python -m note_app assets` vendors the remote assets the pages use (Google
+Fonts), then copies every file in `static/` to `static/dist/` under a name
+that includes a hash of its content, next to pre-compressed `.gz` (and `.br`,
+if the `brotli` package is installed) variants. `static/dist/manifest.json`
+maps original names to hashed ones; the web app uses it to rewrite
+`url_for('static', ...)` and serves hashed files as immutable.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+import urllib.request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+STATIC_DIR = os.path.join(os.path.dirname(__file__), 'static')
+DIST_DIR = 'dist'
+VENDOR_DIR = 'vendor'
+MANIFEST_NAME = 'manifest.json'
+
+FONTS_URL = "https://fonts.googleapis.com/css2?family=Lato:wght@400;700&family=Merriweather:wght@700&display=swap"
+# Google Fonts picks the font format from the User-Agent; this one gets woff2.
+_FONTS_USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36"
+
+COMPRESSIBLE = ('.css', '.js', '.svg', '.json', '.txt', '.html', '.ico')
+_CSS_URL_RE = re.compile(r"url\((['\"]?)([^'\")]+)\1\)")
+
+def _fetch(url):
+    request = urllib.request.Request(url, headers={'User-Agent': _FONTS_USER_AGENT})
+    with urllib.request.urlopen(request, timeout=30) as response:
+        return response.read()
+
+def vendor_fonts(static_dir=STATIC_DIR):
+    """Downloads the Google Fonts stylesheet and font files into static/vendor/."""
+    vendor_dir = os.path.join(static_dir, VENDOR_DIR)
+    os.makedirs(vendor_dir, exist_ok=True)
+    css = _fetch(FONTS_URL).decode('utf-8')
+
+    def localize(match):
+        url = match.group(2)
+        name = os.path.basename(url.split('?')[0])
+        with open(os.path.join(vendor_dir, name), 'wb') as f:
+            f.write(_fetch(url))
+        return f"url({name})"
+
+    css = _CSS_URL_RE.sub(localize, css)
+    with open(os.path.join(vendor_dir, 'fonts.css'), 'w', encoding='utf-8') as f:
+        f.write(css)
+    return os.path.join(vendor_dir, 'fonts.css')
+
+def _source_files(static_dir):
+    for root, dirs, files in os.walk(static_dir):
+        rel_root = os.path.relpath(root, static_dir)
+        if rel_root == DIST_DIR or rel_root.startswith(DIST_DIR + os.sep):
+            continue
+        for name in files:
+            yield os.path.normpath(os.path.join(rel_root, name)).replace(os.sep, '/')
+
+def _hashed_name(name, data):
+    digest = hashlib.sha256(data).hexdigest()[:12]
+    stem, ext = os.path.splitext(name)
+    return f"{stem}.{digest}{ext}"
+
+def _rewrite_css(name, css, manifest):
+    """Points url() references in a stylesheet at the hashed files."""
+    base = os.path.dirname(name)
+
+    def replace(match):
+        url = match.group(2)
+        target = os.path.normpath(os.path.join(base, url)).replace(os.sep, '/')
+        if target not in manifest:
+            return match.group(0)
+        return f"url({os.path.relpath(manifest[target], base or '.').replace(os.sep, '/')})"
+
+    return _CSS_URL_RE.sub(replace, css)
+
+def build(static_dir=STATIC_DIR):
+    """Fingerprints and pre-compresses static files. Returns the manifest."""
+    dist_dir = os.path.join(static_dir, DIST_DIR)
+    shutil.rmtree(dist_dir, ignore_errors=True)
+    os.makedirs(dist_dir)
+
+    manifest = {}
+    # Stylesheets go last so the files they reference already have hashed names.
+    for name in sorted(_source_files(static_dir), key=lambda n: (n.endswith('.css'), n)):
+        with open(os.path.join(static_dir, name), 'rb') as f:
+            data = f.read()
+        if name.endswith('.css'):
+            data = _rewrite_css(name, data.decode('utf-8'), manifest).encode('utf-8')
+        hashed = _hashed_name(name, data)
+        manifest[name] = hashed
+
+        out_path = os.path.join(dist_dir, hashed)
+        os.makedirs(os.path.dirname(out_path), exist_ok=True)
+        with open(out_path, 'wb') as f:
+            f.write(data)
+        if name.endswith(COMPRESSIBLE):
+            with open(out_path + '.gz', 'wb') as f:
+                f.write(gzip.compress(data, 9, mtime=0))
+            if brotli:
+                with open(out_path + '.br', 'wb') as f:
+                    f.write(brotli.compress(data))
+
+    with open(os.path.join(dist_dir, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+def load_manifest(static_dir=STATIC_DIR):
+    """Returns the manifest written by build(), or {} if assets were not built."""
+    try:
+        with open(os.path.join(static_dir, DIST_DIR, MANIFEST_NAME), encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+def main(argv=None):
+    """Entry point for `python -m note_app assets`."""
+    parser = argparse.ArgumentParser(prog="python -m note_app assets", description="Build fingerprinted, pre-compressed static assets.")
+    parser.add_argument("--no-vendor", action="store_true", help="Skip downloading remote assets (Google Fonts).")
+    args = parser.parse_args(argv)
+
+    if not args.no_vendor:
+        try:
+            print(f"Vendored fonts into {vendor_fonts()}.")
+        except OSError as e:
+            print(f"Warning: could not vendor Google Fonts ({e}); pages will keep loading them remotely.")
+    manifest = build()
+    variants = "gzip and brotli" if brotli else "gzip"
+    print(f"Built {len(manifest)} asset(s) with {variants} variants into {os.path.join(STATIC_DIR, DIST_DIR)}.")
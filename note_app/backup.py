@@ -0,0 +1,327 @@
+"""
+Online backup, scheduled snapshots and point-in-time restore for notes.db.
+
+Snapshots use sqlite3's backup API inside a single read transaction on a
+database in WAL mode, so the copy is one consistent state and the web app
+keeps writing while a large database is copied. Pages are copied in batches
+with a pause between them to spread the I/O.
+
+WAL archiving keeps a base copy of the database plus a copy of the WAL
+taken every few seconds; replaying the WAL copies on top of the base
+restores the database as it was at any archive point. While archiving,
+the archiver must be the only process that checkpoints: run every process
+that writes to the database (web app, CLI, compact) with WAL_ARCHIVE=1 so
+its connections disable autocheckpoint.
+
+Layout of a backup directory:
+
+    snapshots/notes-<time>.db (+ .json manifest)
+    wal/<chain time>/base.db (+ .json manifest)
+    wal/<chain time>/<seq>-<time>.wal (+ .json manifest)
+
+Each manifest records when the copy was taken and the row count of every
+table at that moment; restore checks the result against it.
+"""
+import argparse
+import glob
+import json
+import os
+import shutil
+import sqlite3
+import time
+from datetime import datetime
+from . import database
+
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+FILE_TIME_FORMAT = "%Y%m%dT%H%M%S"
+
+# --- Helpers ---
+
+def _now():
+    return datetime.now()
+
+def table_counts(conn):
+    tables = [row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name"
+    )]
+    return {table: conn.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0] for table in tables}
+
+def _write_manifest(path, taken, counts):
+    manifest = {'time': taken.strftime(TIME_FORMAT), 'counts': counts}
+    with open(path + '.json', 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+def _read_manifest(path):
+    with open(path + '.json', encoding='utf-8') as f:
+        manifest = json.load(f)
+    manifest['time'] = datetime.strptime(manifest['time'], TIME_FORMAT)
+    return manifest
+
+def _remove_db_files(path):
+    for suffix in ('', '-wal', '-shm', '-journal'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+def verify(path, expected_counts):
+    """Returns a list of problems found in the database at `path`; empty means it is sound."""
+    conn = sqlite3.connect(path)
+    try:
+        problems = [row[0] for row in conn.execute("PRAGMA integrity_check") if row[0] != 'ok']
+        counts = table_counts(conn)
+    finally:
+        conn.close()
+    for table, expected in expected_counts.items():
+        if counts.get(table) != expected:
+            problems.append(f"{table}: expected {expected} rows, found {counts.get(table)}")
+    return problems
+
+# --- Snapshots ---
+
+def backup_database(src_path, dest_path, pages=256, pause=0.01):
+    """
+    Copies a live database to `dest_path` with the backup API, `pages` pages per
+    step, sleeping `pause` seconds between steps. The copy is written next to
+    the destination and renamed into place, so `dest_path` is never torn.
+
+    The source is switched to WAL mode and read in one transaction for the
+    whole copy. Otherwise SQLite restarts the backup whenever another
+    connection writes, and a steady trickle of writes keeps it from finishing.
+    """
+    tmp_path = dest_path + '.part'
+    _remove_db_files(tmp_path)
+    def progress(status, remaining, total):
+        if remaining:
+            time.sleep(pause)
+
+    src = sqlite3.connect(src_path, isolation_level=None)
+    dst = sqlite3.connect(tmp_path)
+    try:
+        # A no-op for databases made by setup_database(), which are already in WAL mode.
+        src.execute("PRAGMA journal_mode=WAL")
+        # The read transaction pins the state being copied; WAL writers are not blocked by it.
+        src.execute("BEGIN")
+        src.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+        taken = _now()
+        src.backup(dst, pages=pages, progress=progress)
+        src.execute("COMMIT")
+        # The copy inherits WAL mode from the source; a snapshot should be a single file.
+        dst.execute("PRAGMA journal_mode=DELETE")
+        counts = table_counts(dst)
+    finally:
+        dst.close()
+        src.close()
+    os.replace(tmp_path, dest_path)
+    return _write_manifest(dest_path, taken, counts)
+
+def snapshot(db_path, backup_dir, keep=7, pages=256, pause=0.01):
+    """Takes a timestamped snapshot and deletes all but the newest `keep` (at least 1)."""
+    if keep < 1:
+        raise ValueError("keep must be at least 1, or the new snapshot would be deleted too.")
+    snapshot_dir = os.path.join(backup_dir, 'snapshots')
+    os.makedirs(snapshot_dir, exist_ok=True)
+    # Microseconds, so snapshots taken within the same second don't replace each other.
+    dest_path = os.path.join(snapshot_dir, f"notes-{_now().strftime(FILE_TIME_FORMAT + '%f')}.db")
+    backup_database(db_path, dest_path, pages=pages, pause=pause)
+    for old in sorted(glob.glob(os.path.join(snapshot_dir, 'notes-*.db')))[:-keep]:
+        os.remove(old)
+        if os.path.exists(old + '.json'):
+            os.remove(old + '.json')
+    return dest_path
+
+# --- WAL Archiving ---
+
+class WalArchiver:
+    """
+    Archives the WAL of `db_path` into `backup_dir`. Each call to archive()
+    copies the WAL while holding the write lock, then checkpoints it from a
+    second connection before the lock is released, so no committed frame
+    can be checkpointed (and later overwritten) without having been copied.
+    The archiver keeps a connection open for its whole lifetime, which stops
+    other connections from checkpointing and deleting the WAL on close.
+    """
+
+    def __init__(self, db_path, backup_dir):
+        self.db_path = db_path
+        self.backup_dir = backup_dir
+        self.conn = sqlite3.connect(db_path, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA wal_autocheckpoint=0")
+        self.checkpointer = sqlite3.connect(db_path, isolation_level=None)
+        self.chain_dir = None
+        self.seq = 0
+        self.data_version = None
+
+    def close(self):
+        self.checkpointer.close()
+        self.conn.close()
+
+    def _locked_checkpoint(self, copy):
+        """Runs `copy` and a checkpoint while no other connection can write."""
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            taken = _now()
+            result = copy(taken)
+            self.checkpointer.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchall()
+            self.data_version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+            return result
+        finally:
+            self.conn.execute("ROLLBACK")
+
+    def start_chain(self):
+        """Starts a new chain from a fresh base copy; earlier chains stay restorable."""
+        def copy(taken):
+            self.chain_dir = os.path.join(self.backup_dir, 'wal', taken.strftime(FILE_TIME_FORMAT + '%f'))
+            os.makedirs(self.chain_dir)
+            base_path = os.path.join(self.chain_dir, 'base.db')
+            dst = sqlite3.connect(base_path)
+            try:
+                self.checkpointer.backup(dst)
+            finally:
+                dst.close()
+            return _write_manifest(base_path, taken, table_counts(self.conn))
+        self.seq = 0
+        return self._locked_checkpoint(copy)
+
+    def archive(self):
+        """Copies the WAL if anything was committed since the last call. Returns the segment path or None."""
+        if self.chain_dir is None:
+            self.start_chain()
+        if self.conn.execute("PRAGMA data_version").fetchone()[0] == self.data_version:
+            return None
+        wal_path = self.db_path + '-wal'
+        def copy(taken):
+            self.seq += 1
+            segment = os.path.join(self.chain_dir, f"{self.seq:06d}-{taken.strftime(FILE_TIME_FORMAT)}.wal")
+            shutil.copyfile(wal_path, segment)
+            _write_manifest(segment, taken, table_counts(self.conn))
+            return segment
+        return self._locked_checkpoint(copy)
+
+# --- Restore ---
+
+def _restore_points(backup_dir):
+    """Yields (time, base_path, segments, manifest) for every point that can be restored."""
+    for path in glob.glob(os.path.join(backup_dir, 'snapshots', 'notes-*.db')):
+        manifest = _read_manifest(path)
+        yield manifest['time'], path, [], manifest
+    for chain_dir in glob.glob(os.path.join(backup_dir, 'wal', '*')):
+        base_path = os.path.join(chain_dir, 'base.db')
+        if not os.path.exists(base_path + '.json'):
+            continue
+        manifest = _read_manifest(base_path)
+        yield manifest['time'], base_path, [], manifest
+        segments = []
+        for segment in sorted(glob.glob(os.path.join(chain_dir, '*.wal'))):
+            segments.append(segment)
+            manifest = _read_manifest(segment)
+            yield manifest['time'], base_path, list(segments), manifest
+
+def restore(backup_dir, target_path, at=None, force=False):
+    """
+    Restores the newest state taken at or before `at` (default: newest overall)
+    to `target_path`, replaying archived WAL segments where needed. The result
+    is checked with an integrity check and the manifest row counts before it
+    replaces the target. Returns the manifest of the restored point.
+    """
+    if os.path.exists(target_path) and not force:
+        raise FileExistsError(f"{target_path} already exists; pass force=True to overwrite it.")
+    points = [p for p in _restore_points(backup_dir) if at is None or p[0] <= at]
+    if not points:
+        raise LookupError("No backup found for the requested time.")
+    taken, base_path, segments, manifest = max(points, key=lambda p: (p[0], len(p[2])))
+
+    tmp_path = target_path + '.part'
+    _remove_db_files(tmp_path)
+    shutil.copyfile(base_path, tmp_path)
+    try:
+        for segment in segments:
+            # SQLite recovers a WAL file found next to the database when it is opened.
+            shutil.copyfile(segment, tmp_path + '-wal')
+            conn = sqlite3.connect(tmp_path)
+            try:
+                conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            finally:
+                conn.close()
+        conn = sqlite3.connect(tmp_path)
+        try:
+            conn.execute("PRAGMA journal_mode=DELETE")
+        finally:
+            conn.close()
+        problems = verify(tmp_path, manifest['counts'])
+    except sqlite3.DatabaseError as e:
+        # Typically a segment that does not follow on from the previous one,
+        # because some writer checkpointed the WAL behind the archiver's back.
+        problems = [f"{e} (was every writer run with WAL_ARCHIVE=1?)"]
+    if problems:
+        _remove_db_files(tmp_path)
+        raise RuntimeError("Restored database failed verification: " + "; ".join(problems))
+    _remove_db_files(target_path)
+    os.replace(tmp_path, target_path)
+    return manifest
+
+# --- Command Line ---
+
+def _positive_int(value):
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {value}")
+    return number
+
+def main(argv=None):
+    """Entry point for `python -m note_app backup`."""
+    parser = argparse.ArgumentParser(prog="python -m note_app backup", description="Back up and restore the notes database.")
+    parser.add_argument("--database", default=os.environ.get('DATABASE', database.DB_NAME), help="Path to the database file. Defaults to the DATABASE environment variable, then notes.db.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    snap = commands.add_parser("snapshot", help="Take an online snapshot, optionally on a schedule.")
+    snap.add_argument("--dest", required=True, help="Backup directory.")
+    snap.add_argument("--keep", type=_positive_int, default=7, help="Number of snapshots to retain.")
+    snap.add_argument("--every", type=float, help="Repeat every N seconds instead of running once.")
+    snap.add_argument("--pages", type=int, default=256, help="Pages copied per backup step.")
+    snap.add_argument("--pause", type=float, default=0.01, help="Seconds to sleep between backup steps.")
+
+    archive = commands.add_parser("archive", help="Continuously archive the WAL for point-in-time restore.")
+    archive.add_argument("--dest", required=True, help="Backup directory.")
+    archive.add_argument("--interval", type=float, default=60, help="Seconds between WAL copies.")
+
+    rest = commands.add_parser("restore", help="Restore a snapshot or archived point in time.")
+    rest.add_argument("--from", dest="source", required=True, help="Backup directory.")
+    rest.add_argument("--to", dest="target", required=True, help="Path of the database to write.")
+    rest.add_argument("--at", help=f"Restore the state as of this time ('{TIME_FORMAT}'). Defaults to the newest.")
+    rest.add_argument("--force", action="store_true", help="Overwrite the target if it exists.")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "snapshot":
+        while True:
+            start = time.perf_counter()
+            path = snapshot(args.database, args.dest, keep=args.keep, pages=args.pages, pause=args.pause)
+            print(f"Snapshot written to {path} in {time.perf_counter() - start:.2f}s.")
+            if not args.every:
+                return
+            time.sleep(args.every)
+
+    elif args.command == "archive":
+        archiver = WalArchiver(args.database, args.dest)
+        try:
+            manifest = archiver.start_chain()
+            print(f"Started WAL chain in {archiver.chain_dir} at {manifest['time']}.")
+            while True:
+                time.sleep(args.interval)
+                segment = archiver.archive()
+                if segment:
+                    print(f"Archived {segment}.")
+        except KeyboardInterrupt:
+            pass
+        finally:
+            archiver.close()
+
+    elif args.command == "restore":
+        at = datetime.strptime(args.at, TIME_FORMAT) if args.at else None
+        try:
+            manifest = restore(args.source, args.target, at=at, force=args.force)
+        except (FileExistsError, LookupError, RuntimeError) as e:
+            raise SystemExit(f"Error: {e}")
+        total = sum(manifest['counts'].values())
+        print(f"Restored {args.target} to {manifest['time'].strftime(TIME_FORMAT)}; integrity ok, {total} rows verified.")
@@ -7,6 +7,7 @@ import tempfile
 import re
 from datetime import datetime
 from . import database
+from .query import QueryError
 
 def main():
     """Main function for the CLI."""
@@ -24,8 +25,15 @@ def main():
     parser.add_argument("-v", "--view", help="View a single note by its UUID.")
     parser.add_argument("-s", "--save", help="Save a note to a Markdown file by its UUID.")
     parser.add_argument("-d", "--delete", help="Delete a note by its UUID.")
-    parser.add_argument("--search", help="Search for a keyword in note titles and content.")
+    parser.add_argument("--search", help="Search notes, e.g. 'tag:a category:x \"a phrase\" after:2025-01-01 word'.")
+    parser.add_argument("--save-search", metavar="NAME", help="Save the --search query under NAME.")
+    parser.add_argument("--saved", metavar="NAME", help="Run the saved search NAME.")
+    parser.add_argument("--list-saved", action="store_true", help="List saved searches.")
     parser.add_argument("--search-tag", help="Search for notes by a specific tag.")
+    parser.add_argument("--create-token", action="store_true", help="Create an API token for the user and print it.")
+    parser.add_argument("--revoke-tokens", action="store_true", help="Revoke every API token of the user.")
+    parser.add_argument("--rebuild-related", action="store_true", help="Rebuild the related-notes index for the user.")
+    parser.add_argument("--revoke-sessions", action="store_true", help="Log the user out of every web session (requires SERVER_SESSIONS=1 on the web app).")
     
     # Edit-specific arguments
     edit_group = parser.add_argument_group('edit arguments')
@@ -37,6 +45,8 @@ def main():
 
 
     args = parser.parse_args()
+    if args.save_search and not args.search:
+        parser.error("--save-search requires --search")
 
     # --- User Handling ---
     username = args.username or os.environ.get('SELFNOTE_USER')
@@ -51,15 +61,57 @@ def main():
 
     # --- Action Handling ---
 
+    if args.create_token:
+        token = database.create_api_token(user_id)
+        print(f"API token for '{username}' (shown only once):\n{token}")
+        return
+
+    if args.revoke_tokens:
+        count = database.revoke_api_tokens(user_id)
+        print(f"Revoked {count} API token(s) for '{username}'.")
+        return
+
+    if args.revoke_sessions:
+        count = database.revoke_sessions(user_id)
+        print(f"Revoked {count} session(s) for '{username}'.")
+        return
+
+    if args.rebuild_related:
+        count = database.rebuild_related_index(user_id)
+        print(f"Rebuilt related-notes index for {count} note(s).")
+        return
+
     if args.edit:
         _edit_note_handler(args, user_id)
         return
 
     if args.search:
-        notes = database.search_notes(args.search, user_id)
+        try:
+            if args.save_search:
+                database.save_query(args.save_search, args.search, user_id)
+                print(f"Saved search '{args.save_search}'.")
+            notes = database.query_notes(args.search, user_id)
+        except QueryError as e:
+            sys.exit(f"Error: {e}")
         _display_note_list(notes, f"Found {len(notes)} note(s) for user '{username}' matching '{args.search}':")
         return
 
+    if args.saved:
+        saved = database.get_saved_query_by_name(args.saved, user_id)
+        if not saved:
+            sys.exit(f"Error: No saved search named '{args.saved}'.")
+        notes = database.query_notes(saved['query'], user_id)
+        _display_note_list(notes, f"Found {len(notes)} note(s) for saved search '{saved['name']}' ({saved['query']}):")
+        return
+
+    if args.list_saved:
+        saved_queries = database.list_saved_queries(user_id)
+        if not saved_queries:
+            print("No saved searches.")
+        for saved in saved_queries:
+            print(f"{saved['name']}: {saved['query']}")
+        return
+
     if args.search_tag:
         notes = database.search_by_tag(args.search_tag, user_id)
         _display_note_list(notes, f"Found {len(notes)} note(s) for user '{username}' with tag '{args.search_tag}':")
@@ -76,6 +128,8 @@ def main():
     if args.view:
         note = database.get_note(args.view, user_id)
         _display_full_note(note)
+        if note:
+            _display_related(database.get_related_notes(note['id'], user_id))
         return
 
     if args.list is not None:
@@ -91,6 +145,28 @@ def main():
     _create_note_handler(args, user_id)
 
 
+def compact_main(argv=None):
+    """Recompresses note bodies and VACUUMs the database, reporting the space saved."""
+    parser = argparse.ArgumentParser(prog="python -m note_app compact", description=compact_main.__doc__)
+    parser.add_argument("--database", default=os.environ.get('DATABASE', database.DB_NAME), help="Path to the database file. Defaults to the DATABASE environment variable, then notes.db.")
+    args = parser.parse_args(argv)
+
+    database.DB_NAME = args.database
+    database.setup_database()
+    before, after, rewritten = database.compact_database()
+    saved = before - after
+    print(f"Rewrote {rewritten} note(s). {before / 1024:.1f} KiB -> {after / 1024:.1f} KiB (saved {saved / 1024:.1f} KiB, {saved / before:.0%}).")
+
+def migrate_main(argv=None):
+    """Creates missing tables and migrates a database made by an older version."""
+    parser = argparse.ArgumentParser(prog="python -m note_app migrate", description=migrate_main.__doc__)
+    parser.add_argument("--database", default=os.environ.get('DATABASE', database.DB_NAME), help="Path to the database file. Defaults to the DATABASE environment variable, then notes.db.")
+    args = parser.parse_args(argv)
+
+    database.DB_NAME = args.database
+    database.setup_database()
+    print(f"Database {args.database} is up to date.")
+
 # --- Helper Functions for CLI Output and Interaction ---
 
 def _display_note_list(notes, header=""):
@@ -108,7 +184,7 @@ def _display_note_list(notes, header=""):
             print(f"Category: {note['category']}")
         if note.get('tags'):
             print(f"Tags: {note['tags']}")
-        body_preview = note['content'][:100].replace(chr(10), ' ')
+        body_preview = note['excerpt'][:100].replace(chr(10), ' ')
         print(f"Body: {body_preview}...")
 
 def _display_full_note(note):
@@ -124,6 +200,13 @@ def _display_full_note(note):
         print(f"Tags: {note['tags']}")
     print(f"---\n{note['content']}")
 
+def _display_related(related_notes):
+    if not related_notes:
+        return
+    print("---\nRelated notes:")
+    for related in related_notes:
+        print(f"  {related['id']}  {related['title']}")
+
 def _create_note_handler(args, user_id):
     content = _get_content_from_editor()
     if not content.strip():
@@ -1,20 +1,92 @@
+import os
 import sqlite3
 import uuid
-from datetime import datetime
+import hashlib
+import secrets
+import zlib
+from datetime import datetime, timedelta
 from werkzeug.security import generate_password_hash, check_password_hash
+from . import related, query
+from .cache import TTLCache
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
 
 DB_NAME = 'notes.db'
+# 0 while `python -m note_app backup archive` runs, so the archiver is the only
+# one to checkpoint the WAL (see backup.py). Read from the environment so every
+# process that writes (web app, CLI, compact) honours it. None keeps SQLite's default.
+WAL_AUTOCHECKPOINT = 0 if os.environ.get('WAL_ARCHIVE') == '1' else None
+
+# Note bodies larger than this many bytes are stored compressed, as a BLOB
+# whose first byte names the codec. Smaller bodies stay plain TEXT.
+COMPRESS_THRESHOLD = 4096
+EXCERPT_LENGTH = 200
+
+# User records (never including the password hash) cached by (DB_NAME, user id),
+# with usernames mapped to ids. Users rows are never changed after registration;
+# if that changes, note that each process has its own cache, so other workers
+# would serve the old record for up to USER_CACHE.ttl seconds. Server-side
+# session checks are cached for a short time so a revocation reaches every
+# worker within SESSION_CACHE.ttl seconds.
+USER_CACHE = TTLCache(maxsize=1024, ttl=300)
+USERNAME_CACHE = TTLCache(maxsize=1024, ttl=300)
+SESSION_CACHE = TTLCache(maxsize=4096, ttl=30)
+# Server-side sessions end this long after login; expired rows are pruned at the next login.
+SESSION_LIFETIME = timedelta(days=int(os.environ.get('SESSION_LIFETIME_DAYS', 30)))
+_USER_COLUMNS = "id, username, email"
+_ZLIB, _ZSTD = b'Z', b'S'
+
+def encode_content(content):
+    """Returns the value to store in `note_bodies.content` for a note body."""
+    raw = content.encode('utf-8')
+    if len(raw) < COMPRESS_THRESHOLD:
+        return content
+    if zstandard:
+        packed = _ZSTD + zstandard.ZstdCompressor(level=10).compress(raw)
+    else:
+        packed = _ZLIB + zlib.compress(raw, 9)
+    # Not worth the decompression cost if it barely shrinks.
+    return packed if len(packed) < len(raw) * 0.9 else content
+
+def decode_content(value):
+    """Inverse of encode_content; plain TEXT values are returned unchanged."""
+    if not isinstance(value, bytes):
+        return value
+    codec, packed = value[:1], value[1:]
+    if codec == _ZSTD:
+        if not zstandard:
+            raise RuntimeError("This note is zstd-compressed; install the 'zstandard' package to read it.")
+        return zstandard.ZstdDecompressor().decompress(packed).decode('utf-8')
+    return zlib.decompress(packed).decode('utf-8')
+
+def _excerpt(content):
+    return content[:EXCERPT_LENGTH]
 
 def get_db_conn():
     """Helper to create a database connection."""
     conn = sqlite3.connect(DB_NAME)
     conn.row_factory = sqlite3.Row
+    # Lets SQL (e.g. search LIKE clauses) see the decompressed note text.
+    conn.create_function("note_text", 1, decode_content, deterministic=True)
+    if WAL_AUTOCHECKPOINT is not None:
+        conn.execute(f"PRAGMA wal_autocheckpoint={int(WAL_AUTOCHECKPOINT)}")
     return conn
 
 def setup_database():
-    """Creates the database and tables if they don't exist."""
+    """
+    Creates the database and tables if they don't exist, and migrates databases
+    made by older versions. Run it before serving (`python -m note_app migrate`).
+    """
     with get_db_conn() as conn:
         cursor = conn.cursor()
+        # Readers and online backups don't block writers in WAL mode; the setting persists in the file.
+        cursor.execute("PRAGMA journal_mode=WAL")
+        # Holds the write lock for the whole check-and-migrate, so two processes
+        # starting together can't both decide to migrate.
+        cursor.execute("BEGIN IMMEDIATE")
         cursor.execute('''
         CREATE TABLE IF NOT EXISTS users (
             id TEXT PRIMARY KEY,
@@ -42,13 +114,31 @@ def setup_database():
         CREATE TABLE IF NOT EXISTS notes (
             id TEXT PRIMARY KEY,
             title TEXT NOT NULL,
-            content TEXT NOT NULL,
             timestamp DATETIME NOT NULL,
             category_id TEXT,
             user_id TEXT NOT NULL,
+            excerpt TEXT,
             FOREIGN KEY (category_id) REFERENCES categories (id),
             FOREIGN KEY (user_id) REFERENCES users (id)
         )''')
+        # Bodies live in their own table, so list queries read short rows and
+        # never walk a large body's overflow pages to reach the columns they need.
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS note_bodies (
+            note_id TEXT PRIMARY KEY,
+            content NOT NULL,
+            FOREIGN KEY (note_id) REFERENCES notes (id) ON DELETE CASCADE
+        )''')
+        # Databases created before compression lack the excerpt column that
+        # list queries read instead of the (possibly compressed) body, and
+        # older ones still keep the body in notes.content.
+        columns = [row['name'] for row in cursor.execute("PRAGMA table_info(notes)")]
+        if 'excerpt' not in columns:
+            cursor.execute("ALTER TABLE notes ADD COLUMN excerpt TEXT")
+            cursor.execute(f"UPDATE notes SET excerpt = substr(content, 1, {EXCERPT_LENGTH})")
+        if 'content' in columns:
+            cursor.execute("INSERT INTO note_bodies (note_id, content) SELECT id, content FROM notes")
+            cursor.execute("ALTER TABLE notes DROP COLUMN content")
         cursor.execute('''
         CREATE TABLE IF NOT EXISTS note_tags (
             note_id TEXT NOT NULL,
@@ -57,6 +147,72 @@ def setup_database():
             FOREIGN KEY (note_id) REFERENCES notes (id) ON DELETE CASCADE,
             FOREIGN KEY (tag_id) REFERENCES tags (id) ON DELETE CASCADE
         )''')
+        # Indexes used by the compiled search queries (see query.py).
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_notes_user_timestamp ON notes (user_id, timestamp)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_note_tags_tag ON note_tags (tag_id)")
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS saved_queries (
+            id TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            query TEXT NOT NULL,
+            user_id TEXT NOT NULL,
+            FOREIGN KEY (user_id) REFERENCES users (id),
+            UNIQUE(name, user_id)
+        )''')
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS api_tokens (
+            token_hash TEXT PRIMARY KEY,
+            user_id TEXT NOT NULL,
+            created DATETIME NOT NULL,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )''')
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS sessions (
+            session_hash TEXT PRIMARY KEY,
+            user_id TEXT NOT NULL,
+            created DATETIME NOT NULL,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_sessions_created ON sessions (created)")
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS note_vectors (
+            note_id TEXT PRIMARY KEY,
+            user_id TEXT NOT NULL,
+            terms TEXT NOT NULL,
+            FOREIGN KEY (note_id) REFERENCES notes (id) ON DELETE CASCADE
+        )''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_note_vectors_user ON note_vectors (user_id)")
+        # Databases indexed before postings were stored keep raw term counts in
+        # note_vectors; they are reindexed below once the tables exist.
+        reindex = not cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'note_terms'").fetchone()
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS note_terms (
+            user_id TEXT NOT NULL,
+            term TEXT NOT NULL,
+            note_id TEXT NOT NULL,
+            weight REAL NOT NULL,
+            PRIMARY KEY (user_id, term, note_id)
+        ) WITHOUT ROWID''')
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS term_stats (
+            user_id TEXT NOT NULL,
+            term TEXT NOT NULL,
+            df INTEGER NOT NULL,
+            PRIMARY KEY (user_id, term)
+        ) WITHOUT ROWID''')
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS related_notes (
+            note_id TEXT NOT NULL,
+            related_id TEXT NOT NULL,
+            score REAL NOT NULL,
+            PRIMARY KEY (note_id, related_id),
+            FOREIGN KEY (note_id) REFERENCES notes (id) ON DELETE CASCADE,
+            FOREIGN KEY (related_id) REFERENCES notes (id) ON DELETE CASCADE
+        )''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_related_notes_related ON related_notes (related_id)")
+        if reindex:
+            for row in cursor.execute("SELECT DISTINCT user_id FROM note_vectors").fetchall():
+                rebuild_related_index(row['user_id'], conn)
         conn.commit()
 
 # --- User Functions ---
@@ -77,19 +233,136 @@ def create_user(username, email, password, db_conn=None):
         if not db_conn: conn.close()
     return user_id
 
+def _cache_user(user):
+    USER_CACHE.set((DB_NAME, user['id']), user)
+    USERNAME_CACHE.set((DB_NAME, user['username']), user['id'])
+
+def get_user(user_id, db_conn=None):
+    """Returns a user's id, username and email. Served from USER_CACHE when possible."""
+    user = USER_CACHE.get((DB_NAME, user_id))
+    if user is None:
+        conn = db_conn or get_db_conn()
+        row = conn.execute(f"SELECT {_USER_COLUMNS} FROM users WHERE id = ?", (user_id,)).fetchone()
+        if not db_conn: conn.close()
+        if not row: return None
+        user = dict(row)
+        _cache_user(user)
+    return dict(user)
+
 def get_user_by_username(username, db_conn=None):
+    user_id = USERNAME_CACHE.get((DB_NAME, username))
+    if user_id is not None:
+        user = get_user(user_id, db_conn=db_conn)
+        if user and user['username'] == username:
+            return user
     conn = db_conn or get_db_conn()
-    cursor = conn.execute("SELECT * FROM users WHERE username = ?", (username,))
-    user = cursor.fetchone()
+    row = conn.execute(f"SELECT {_USER_COLUMNS} FROM users WHERE username = ?", (username,)).fetchone()
     if not db_conn: conn.close()
-    return dict(user) if user else None
+    if not row: return None
+    user = dict(row)
+    _cache_user(user)
+    return dict(user)
 
 def verify_password(username, password, db_conn=None):
-    user = get_user_by_username(username, db_conn=db_conn)
-    if user and check_password_hash(user['password'], password):
-        return user
+    # The hash is read here only and never enters the user cache.
+    conn = db_conn or get_db_conn()
+    row = conn.execute("SELECT id, password FROM users WHERE username = ?", (username,)).fetchone()
+    if not db_conn: conn.close()
+    if row and check_password_hash(row['password'], password):
+        return get_user(row['id'], db_conn=db_conn)
     return None
 
+# --- API Token Functions ---
+
+def _hash_token(token):
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+def create_api_token(user_id, db_conn=None):
+    """Creates a new API token for a user. Only the hash is stored, so the
+    plain token is returned once and cannot be recovered later."""
+    conn = db_conn or get_db_conn()
+    token = secrets.token_urlsafe(32)
+    created = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    with conn:
+        conn.execute(
+            "INSERT INTO api_tokens (token_hash, user_id, created) VALUES (?, ?, ?)",
+            (_hash_token(token), user_id, created)
+        )
+    if not db_conn: conn.close()
+    return token
+
+def get_user_by_token(token, db_conn=None):
+    if not token: return None
+    conn = db_conn or get_db_conn()
+    cursor = conn.execute("""
+        SELECT u.id, u.username, u.email
+        FROM api_tokens a JOIN users u ON a.user_id = u.id
+        WHERE a.token_hash = ?
+    """, (_hash_token(token),))
+    user = cursor.fetchone()
+    if not db_conn: conn.close()
+    return dict(user) if user else None
+
+def revoke_api_tokens(user_id, db_conn=None):
+    conn = db_conn or get_db_conn()
+    with conn:
+        cursor = conn.execute("DELETE FROM api_tokens WHERE user_id = ?", (user_id,))
+    if not db_conn: conn.close()
+    return cursor.rowcount
+
+# --- Server-Side Session Functions ---
+
+def _session_cutoff():
+    return (datetime.now() - SESSION_LIFETIME).strftime("%Y-%m-%d %H:%M:%S")
+
+def create_session(user_id, db_conn=None):
+    """Records a login session and returns its id, to be stored in the session cookie.
+    Sessions older than SESSION_LIFETIME are deleted at the same time."""
+    conn = db_conn or get_db_conn()
+    session_id = secrets.token_urlsafe(32)
+    created = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    with conn:
+        conn.execute("DELETE FROM sessions WHERE created <= ?", (_session_cutoff(),))
+        conn.execute(
+            "INSERT INTO sessions (session_hash, user_id, created) VALUES (?, ?, ?)",
+            (_hash_token(session_id), user_id, created)
+        )
+    if not db_conn: conn.close()
+    return session_id
+
+def session_is_valid(session_id, user_id, db_conn=None):
+    if not session_id: return False
+    key = (DB_NAME, _hash_token(session_id))
+    owner = SESSION_CACHE.get(key)
+    if owner is None:
+        conn = db_conn or get_db_conn()
+        row = conn.execute(
+            "SELECT user_id FROM sessions WHERE session_hash = ? AND created > ?",
+            (key[1], _session_cutoff())
+        ).fetchone()
+        if not db_conn: conn.close()
+        # Unknown sessions are cached too, as '' so they can be told apart from a miss.
+        owner = row['user_id'] if row else ''
+        SESSION_CACHE.set(key, owner)
+    return owner == user_id
+
+def delete_session(session_id, db_conn=None):
+    if not session_id: return
+    conn = db_conn or get_db_conn()
+    with conn:
+        conn.execute("DELETE FROM sessions WHERE session_hash = ?", (_hash_token(session_id),))
+    if not db_conn: conn.close()
+    SESSION_CACHE.pop((DB_NAME, _hash_token(session_id)))
+
+def revoke_sessions(user_id, db_conn=None):
+    """Ends every server-side session of a user. Returns how many were revoked."""
+    conn = db_conn or get_db_conn()
+    with conn:
+        cursor = conn.execute("DELETE FROM sessions WHERE user_id = ?", (user_id,))
+    if not db_conn: conn.close()
+    SESSION_CACHE.clear()
+    return cursor.rowcount
+
 # --- Note & Metadata Functions ---
 
 def _get_or_create_category(conn, category_name, user_id):
@@ -116,27 +389,57 @@ def _get_or_create_tags(conn, tag_names_str, user_id):
             tag_ids.append(new_id)
     return tag_ids
 
-def add_note(title, content, category_name, tags_str, user_id, db_conn=None):
-    conn = db_conn or get_db_conn()
+def _insert_note(conn, title, content, category_name, tags_str, user_id):
     note_id = str(uuid.uuid4())
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    category_id = _get_or_create_category(conn, category_name, user_id)
+    tag_ids = _get_or_create_tags(conn, tags_str, user_id)
+    conn.execute(
+        "INSERT INTO notes (id, title, excerpt, timestamp, category_id, user_id) VALUES (?, ?, ?, ?, ?, ?)",
+        (note_id, title, _excerpt(content), timestamp, category_id, user_id)
+    )
+    conn.execute("INSERT INTO note_bodies (note_id, content) VALUES (?, ?)", (note_id, encode_content(content)))
+    conn.executemany("INSERT INTO note_tags (note_id, tag_id) VALUES (?, ?)", [(note_id, tag_id) for tag_id in tag_ids])
+    return note_id
+
+def _update_note(conn, note_id, title, content, category_name, tags_str, user_id):
+    cursor = conn.execute("SELECT id FROM notes WHERE id = ? AND user_id = ?", (note_id, user_id))
+    if not cursor.fetchone():
+        return False
+    category_id = _get_or_create_category(conn, category_name, user_id)
+    conn.execute(
+        "UPDATE notes SET title = ?, excerpt = ?, category_id = ? WHERE id = ?",
+        (title, _excerpt(content), category_id, note_id)
+    )
+    conn.execute("UPDATE note_bodies SET content = ? WHERE note_id = ?", (encode_content(content), note_id))
+    conn.execute("DELETE FROM note_tags WHERE note_id = ?", (note_id,))
+    tag_ids = _get_or_create_tags(conn, tags_str, user_id)
+    conn.executemany("INSERT INTO note_tags (note_id, tag_id) VALUES (?, ?)", [(note_id, tag_id) for tag_id in tag_ids])
+    return True
+
+def _delete_note(conn, note_id, user_id):
+    cursor = conn.execute("SELECT id FROM notes WHERE id = ? AND user_id = ?", (note_id, user_id))
+    if not cursor.fetchone():
+        return False
+    conn.execute("DELETE FROM note_tags WHERE note_id = ?", (note_id,))
+    conn.execute("DELETE FROM note_bodies WHERE note_id = ?", (note_id,))
+    conn.execute("DELETE FROM notes WHERE id = ?", (note_id,))
+    return True
+
+def add_note(title, content, category_name, tags_str, user_id, db_conn=None):
+    conn = db_conn or get_db_conn()
     with conn:
-        category_id = _get_or_create_category(conn, category_name, user_id)
-        tag_ids = _get_or_create_tags(conn, tags_str, user_id)
-        conn.execute(
-            "INSERT INTO notes (id, title, content, timestamp, category_id, user_id) VALUES (?, ?, ?, ?, ?, ?)",
-            (note_id, title, content, timestamp, category_id, user_id)
-        )
-        for tag_id in tag_ids:
-            conn.execute("INSERT INTO note_tags (note_id, tag_id) VALUES (?, ?)", (note_id, tag_id))
+        note_id = _insert_note(conn, title, content, category_name, tags_str, user_id)
+        related.index_notes(conn, [{'id': note_id, 'title': title, 'content': content}], user_id)
     if not db_conn: conn.close()
     return note_id
 
 def get_note(note_id, user_id, db_conn=None):
     conn = db_conn or get_db_conn()
     cursor = conn.execute("""
-        SELECT n.id, n.timestamp, n.title, n.content, c.name as category, GROUP_CONCAT(t.name, ', ') as tags
+        SELECT n.id, n.timestamp, n.title, b.content, c.name as category, GROUP_CONCAT(t.name, ', ') as tags
         FROM notes n
+        JOIN note_bodies b ON b.note_id = n.id
         LEFT JOIN categories c ON n.category_id = c.id
         LEFT JOIN note_tags nt ON n.id = nt.note_id
         LEFT JOIN tags t ON nt.tag_id = t.id
@@ -145,11 +448,14 @@ def get_note(note_id, user_id, db_conn=None):
     """, (note_id, user_id))
     note = cursor.fetchone()
     if not db_conn: conn.close()
-    return dict(note) if note else None
+    if not note: return None
+    note = dict(note)
+    note['content'] = decode_content(note['content'])
+    return note
 
 def list_notes(user_id, category_name=None, db_conn=None):
     conn = db_conn or get_db_conn()
-    query = "SELECT n.id, n.timestamp, n.title, n.content, c.name as category, GROUP_CONCAT(t.name, ', ') as tags FROM notes n LEFT JOIN categories c ON n.category_id = c.id LEFT JOIN note_tags nt ON n.id = nt.note_id LEFT JOIN tags t ON nt.tag_id = t.id WHERE n.user_id = ?"
+    query = "SELECT n.id, n.timestamp, n.title, n.excerpt, c.name as category, GROUP_CONCAT(t.name, ', ') as tags FROM notes n LEFT JOIN categories c ON n.category_id = c.id LEFT JOIN note_tags nt ON n.id = nt.note_id LEFT JOIN tags t ON nt.tag_id = t.id WHERE n.user_id = ?"
     params = [user_id]
     if category_name:
         query += " AND c.name = ?"
@@ -163,45 +469,226 @@ def list_notes(user_id, category_name=None, db_conn=None):
 def update_note(note_id, title, content, category_name, tags_str, user_id, db_conn=None):
     conn = db_conn or get_db_conn()
     with conn:
-        cursor = conn.execute("SELECT id FROM notes WHERE id = ? AND user_id = ?", (note_id, user_id))
-        if cursor.fetchone():
-            category_id = _get_or_create_category(conn, category_name, user_id)
-            conn.execute(
-                "UPDATE notes SET title = ?, content = ?, category_id = ? WHERE id = ?",
-                (title, content, category_id, note_id)
-            )
-            conn.execute("DELETE FROM note_tags WHERE note_id = ?", (note_id,))
-            tag_ids = _get_or_create_tags(conn, tags_str, user_id)
-            for tag_id in tag_ids:
-                conn.execute("INSERT INTO note_tags (note_id, tag_id) VALUES (?, ?)", (note_id, tag_id))
+        if _update_note(conn, note_id, title, content, category_name, tags_str, user_id):
+            related.index_notes(conn, [{'id': note_id, 'title': title, 'content': content}], user_id)
     if not db_conn: conn.close()
 
 def delete_note(note_id, user_id, db_conn=None):
     conn = db_conn or get_db_conn()
     with conn:
-        cursor = conn.execute("SELECT id FROM notes WHERE id = ? AND user_id = ?", (note_id, user_id))
-        if cursor.fetchone():
-            conn.execute("DELETE FROM note_tags WHERE note_id = ?", (note_id,))
-            conn.execute("DELETE FROM notes WHERE id = ?", (note_id,))
+        if _delete_note(conn, note_id, user_id):
+            related.remove_notes(conn, [note_id], user_id)
     if not db_conn: conn.close()
 
-def search_notes(keyword, user_id, db_conn=None):
+# --- Batch Functions ---
+# Each batch function runs all of its notes in a single transaction, so a
+# failure part-way through leaves the database untouched.
+
+NOTE_FIELDS = {
+    'id': "n.id",
+    'timestamp': "n.timestamp",
+    'title': "n.title",
+    'content': "b.content",
+    'excerpt': "n.excerpt",
+    'category': "c.name as category",
+    'tags': "GROUP_CONCAT(t.name, ', ') as tags",
+}
+
+def add_notes(notes, user_id, db_conn=None):
+    """Creates several notes at once. `notes` is a list of dicts with `title`,
+    `content` and optional `category`/`tags` keys. Returns the new ids in order."""
     conn = db_conn or get_db_conn()
-    query = "SELECT n.id, n.timestamp, n.title, n.content, c.name as category, GROUP_CONCAT(t.name, ', ') as tags FROM notes n LEFT JOIN categories c ON n.category_id = c.id LEFT JOIN note_tags nt ON n.id = nt.note_id LEFT JOIN tags t ON nt.tag_id = t.id WHERE n.user_id = ? AND (n.title LIKE ? OR n.content LIKE ?) GROUP BY n.id ORDER BY n.timestamp DESC"
-    params = [user_id, f'%{keyword}%', f'%{keyword}%']
-    cursor = conn.execute(query, params)
+    try:
+        with conn:
+            note_ids = [
+                _insert_note(conn, n['title'], n['content'], n.get('category'), n.get('tags'), user_id)
+                for n in notes
+            ]
+            related.index_notes(conn, [
+                {'id': note_id, 'title': n['title'], 'content': n['content']} for note_id, n in zip(note_ids, notes)
+            ], user_id)
+    finally:
+        if not db_conn: conn.close()
+    return note_ids
+
+def update_notes(notes, user_id, db_conn=None):
+    """Updates several notes at once. Each dict must carry the note `id`; missing
+    fields keep their current value. An id given twice applies both changes in
+    order. Returns the ids that were actually updated, each once."""
+    conn = db_conn or get_db_conn()
+    updated = {}
+    try:
+        with conn:
+            current = {n['id']: n for n in _fetch_notes(conn, [n['id'] for n in notes], user_id)}
+            for n in notes:
+                existing = current.get(n['id'])
+                if not existing:
+                    continue
+                merged = {key: n.get(key, existing[key]) for key in ('title', 'content', 'category', 'tags')}
+                _update_note(conn, n['id'], merged['title'], merged['content'], merged['category'], merged['tags'], user_id)
+                # Later items for the same id merge onto this result, not the original.
+                current[n['id']] = merged
+                updated[n['id']] = {'id': n['id'], 'title': merged['title'], 'content': merged['content']}
+            related.index_notes(conn, list(updated.values()), user_id)
+    finally:
+        if not db_conn: conn.close()
+    return list(updated)
+
+def delete_notes(note_ids, user_id, db_conn=None):
+    """Deletes several notes at once. Returns the ids that were actually deleted."""
+    conn = db_conn or get_db_conn()
+    try:
+        with conn:
+            deleted = [note_id for note_id in note_ids if _delete_note(conn, note_id, user_id)]
+            related.remove_notes(conn, deleted, user_id)
+    finally:
+        if not db_conn: conn.close()
+    return deleted
+
+def _fetch_notes(conn, note_ids, user_id, fields=None):
+    if not note_ids: return []
+    fields = fields or list(NOTE_FIELDS)
+    columns = ", ".join(NOTE_FIELDS[f] for f in fields)
+    placeholders = ", ".join("?" for _ in note_ids)
+    query = f"SELECT {columns} FROM notes n LEFT JOIN categories c ON n.category_id = c.id"
+    if 'content' in fields:
+        query += " JOIN note_bodies b ON b.note_id = n.id"
+    if 'tags' in fields:
+        query += " LEFT JOIN note_tags nt ON n.id = nt.note_id LEFT JOIN tags t ON nt.tag_id = t.id"
+    query += f" WHERE n.user_id = ? AND n.id IN ({placeholders}) GROUP BY n.id ORDER BY n.timestamp DESC"
+    cursor = conn.execute(query, [user_id, *note_ids])
     notes = [dict(row) for row in cursor.fetchall()]
+    if 'content' in fields:
+        for note in notes:
+            note['content'] = decode_content(note['content'])
+    return notes
+
+def get_notes(note_ids, user_id, fields=None, db_conn=None):
+    """Fetches several notes by id. `fields` limits the returned columns to a
+    subset of NOTE_FIELDS, so callers that skip `content` never read it."""
+    conn = db_conn or get_db_conn()
+    notes = _fetch_notes(conn, list(note_ids), user_id, fields)
     if not db_conn: conn.close()
     return notes
 
 def search_by_tag(tag_name, user_id, db_conn=None):
     conn = db_conn or get_db_conn()
-    query = "SELECT n.id, n.timestamp, n.title, n.content, c.name as category, GROUP_CONCAT(t.name, ', ') as tags FROM notes n LEFT JOIN categories c ON n.category_id = c.id LEFT JOIN note_tags nt ON n.id = nt.note_id LEFT JOIN tags t ON nt.tag_id = t.id WHERE n.user_id = ? AND n.id IN (SELECT note_id FROM note_tags WHERE tag_id IN (SELECT id FROM tags WHERE name = ? AND user_id = ?)) GROUP BY n.id ORDER BY n.timestamp DESC"
+    query = "SELECT n.id, n.timestamp, n.title, n.excerpt, c.name as category, GROUP_CONCAT(t.name, ', ') as tags FROM notes n LEFT JOIN categories c ON n.category_id = c.id LEFT JOIN note_tags nt ON n.id = nt.note_id LEFT JOIN tags t ON nt.tag_id = t.id WHERE n.user_id = ? AND n.id IN (SELECT note_id FROM note_tags WHERE tag_id IN (SELECT id FROM tags WHERE name = ? AND user_id = ?)) GROUP BY n.id ORDER BY n.timestamp DESC"
     cursor = conn.execute(query, (user_id, tag_name, user_id))
     notes = [dict(row) for row in cursor.fetchall()]
     if not db_conn: conn.close()
     return notes
 
+def query_notes(query_text, user_id, db_conn=None):
+    """Runs a search-language query (see query.py) as one SQL statement. Raises query.QueryError."""
+    sql, params = query.bind(query_text, user_id)
+    conn = db_conn or get_db_conn()
+    cursor = conn.execute(sql, params)
+    notes = [dict(row) for row in cursor.fetchall()]
+    if not db_conn: conn.close()
+    return notes
+
+# --- Saved Query Functions ---
+
+def save_query(name, query_text, user_id, db_conn=None):
+    """Saves (or replaces) a named query. The query is compiled first, so invalid ones are rejected."""
+    query.compile_query(query_text)
+    conn = db_conn or get_db_conn()
+    query_id = str(uuid.uuid4())
+    with conn:
+        conn.execute("DELETE FROM saved_queries WHERE name = ? AND user_id = ?", (name, user_id))
+        conn.execute(
+            "INSERT INTO saved_queries (id, name, query, user_id) VALUES (?, ?, ?, ?)",
+            (query_id, name, query_text, user_id)
+        )
+    if not db_conn: conn.close()
+    return query_id
+
+def list_saved_queries(user_id, db_conn=None):
+    conn = db_conn or get_db_conn()
+    cursor = conn.execute("SELECT id, name, query FROM saved_queries WHERE user_id = ? ORDER BY name", (user_id,))
+    queries = [dict(row) for row in cursor.fetchall()]
+    if not db_conn: conn.close()
+    return queries
+
+def get_saved_query(query_id, user_id, db_conn=None):
+    conn = db_conn or get_db_conn()
+    cursor = conn.execute("SELECT id, name, query FROM saved_queries WHERE id = ? AND user_id = ?", (query_id, user_id))
+    saved = cursor.fetchone()
+    if not db_conn: conn.close()
+    return dict(saved) if saved else None
+
+def get_saved_query_by_name(name, user_id, db_conn=None):
+    conn = db_conn or get_db_conn()
+    cursor = conn.execute("SELECT id, name, query FROM saved_queries WHERE name = ? AND user_id = ?", (name, user_id))
+    saved = cursor.fetchone()
+    if not db_conn: conn.close()
+    return dict(saved) if saved else None
+
+def delete_saved_query(query_id, user_id, db_conn=None):
+    conn = db_conn or get_db_conn()
+    with conn:
+        conn.execute("DELETE FROM saved_queries WHERE id = ? AND user_id = ?", (query_id, user_id))
+    if not db_conn: conn.close()
+
+def get_related_notes(note_id, user_id, db_conn=None):
+    """Returns the precomputed neighbours of a note, best match first."""
+    conn = db_conn or get_db_conn()
+    cursor = conn.execute("""
+        SELECT n.id, n.title, r.score
+        FROM related_notes r JOIN notes n ON n.id = r.related_id
+        WHERE r.note_id = ? AND n.user_id = ?
+        ORDER BY r.score DESC
+    """, (note_id, user_id))
+    notes = [dict(row) for row in cursor.fetchall()]
+    if not db_conn: conn.close()
+    return notes
+
+def rebuild_related_index(user_id, db_conn=None):
+    """Recomputes the related-notes index for all of a user's notes."""
+    conn = db_conn or get_db_conn()
+    with conn:
+        notes = [
+            {'id': row['id'], 'title': row['title'], 'content': decode_content(row['content'])}
+            for row in conn.execute(
+                "SELECT n.id, n.title, b.content FROM notes n JOIN note_bodies b ON b.note_id = n.id WHERE n.user_id = ?",
+                (user_id,)
+            )
+        ]
+        count = related.rebuild_index(conn, user_id, notes)
+    if not db_conn: conn.close()
+    return count
+
+def _database_size(conn):
+    page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    return page_count * page_size
+
+def compact_database(db_conn=None):
+    """
+    Re-encodes every note body with the current codec and threshold, refreshes
+    excerpts, then VACUUMs the file. Meant to run offline, as VACUUM rewrites
+    the whole database. Returns (bytes_before, bytes_after, notes_rewritten).
+    """
+    conn = db_conn or get_db_conn()
+    size_before = _database_size(conn)
+    rewritten = 0
+    with conn:
+        rows = conn.execute("SELECT n.id, b.content, n.excerpt FROM notes n JOIN note_bodies b ON b.note_id = n.id").fetchall()
+        for row in rows:
+            content = decode_content(row['content'])
+            encoded = encode_content(content)
+            if encoded != row['content']:
+                conn.execute("UPDATE note_bodies SET content = ? WHERE note_id = ?", (encoded, row['id']))
+            if row['excerpt'] != _excerpt(content):
+                conn.execute("UPDATE notes SET excerpt = ? WHERE id = ?", (_excerpt(content), row['id']))
+            if encoded != row['content'] or row['excerpt'] != _excerpt(content):
+                rewritten += 1
+    conn.execute("VACUUM")
+    size_after = _database_size(conn)
+    if not db_conn: conn.close()
+    return size_before, size_after, rewritten
+
 def get_all_categories(user_id, db_conn=None):
     conn = db_conn or get_db_conn()
     cursor = conn.execute("SELECT name FROM categories WHERE user_id = ? ORDER BY name", (user_id,))
@@ -0,0 +1,109 @@
+"""
+A small search language compiled to a single parameterized SQL statement.
+
+    tag:python tag:"web dev" category:Work "exact phrase" after:2025-01-01 before:2025-07-01 flask -draft
+
+Terms are ANDed together and any term can be negated with a leading `-`:
+
+- `word` / `"a phrase"` -- appears in the title or content (case-insensitive).
+- `tag:name` -- has the tag, or a child tag such as `name/sub`.
+- `category:name` -- is in the category, or a child such as `name/sub`.
+- `after:YYYY-MM-DD` / `before:YYYY-MM-DD` -- created on/after, or before, that day.
+
+Tag and category names match case-sensitively, as they are stored.
+Unknown `key:value` pairs are searched as plain words, so pasted URLs still work.
+"""
+import re
+from datetime import datetime
+from functools import lru_cache
+
+class QueryError(ValueError):
+    pass
+
+_TOKEN_RE = re.compile(r'(-?)(?:(\w+):)?(?:"([^"]*)"?|(\S+))')
+_FILTER_KEYS = ('tag', 'category', 'after', 'before')
+
+# Plain TEXT bodies are matched directly; compressed ones go through note_text().
+_CONTENT_SQL = "(CASE WHEN typeof(b.content) = 'blob' THEN note_text(b.content) ELSE b.content END)"
+
+_SELECT = (
+    "SELECT n.id, n.timestamp, n.title, n.excerpt, c.name as category, GROUP_CONCAT(t.name, ', ') as tags "
+    "FROM notes n LEFT JOIN categories c ON n.category_id = c.id "
+    "LEFT JOIN note_tags nt ON n.id = nt.note_id LEFT JOIN tags t ON nt.tag_id = t.id"
+)
+
+def parse(text):
+    """Splits a query into (key, value, negated) terms; key is None for plain words and phrases."""
+    terms = []
+    for match in _TOKEN_RE.finditer(text or ''):
+        negated, key, quoted, bare = match.groups()
+        value = quoted if quoted is not None else bare
+        if key and key.lower() in _FILTER_KEYS:
+            key = key.lower()
+        elif key:
+            value, key = f"{key}:{value}", None
+        if not value:
+            continue
+        if key in ('after', 'before'):
+            try:
+                datetime.strptime(value, "%Y-%m-%d")
+            except ValueError:
+                raise QueryError(f"'{key}:' expects a date like 2025-01-31, got '{value}'.")
+        terms.append((key, value, bool(negated)))
+    if not terms and text and text.strip():
+        raise QueryError(f"'{text}' has no search terms.")
+    return terms
+
+# Marker for where the user id goes in a compiled parameter list.
+USER = object()
+
+def _like_escape(value):
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+def _compile_term(key, value):
+    """Returns (sql, params) for one term. Every clause is true or false, never NULL, so NOT is safe."""
+    if key is None:
+        pattern = f"%{_like_escape(value)}%"
+        # Bodies are only read for notes whose title does not match.
+        return (
+            f"(n.title LIKE ? ESCAPE '\\' OR EXISTS (SELECT 1 FROM note_bodies b "
+            f"WHERE b.note_id = n.id AND {_CONTENT_SQL} LIKE ? ESCAPE '\\'))",
+            [pattern, pattern]
+        )
+    if key == 'tag':
+        # Children of "a" are the names in ["a/", "a0"), '0' being the character after '/';
+        # a range rather than LIKE lets SQLite search the (name, user_id) index.
+        return (
+            "n.id IN (SELECT nt2.note_id FROM note_tags nt2 JOIN tags t2 ON t2.id = nt2.tag_id "
+            "WHERE t2.user_id = ? AND (t2.name = ? OR (t2.name >= ? AND t2.name < ?)))",
+            [USER, value, f"{value}/", f"{value}0"]
+        )
+    if key == 'category':
+        return (
+            "EXISTS (SELECT 1 FROM categories c2 WHERE c2.id = n.category_id "
+            "AND c2.user_id = ? AND (c2.name = ? OR (c2.name >= ? AND c2.name < ?)))",
+            [USER, value, f"{value}/", f"{value}0"]
+        )
+    if key == 'after':
+        return "n.timestamp >= ?", [value]
+    return "n.timestamp < ?", [value]
+
+@lru_cache(maxsize=256)
+def compile_query(text):
+    """
+    Compiles a query into (sql, params) with USER markers for the user id.
+    The result depends only on the text, so it is cached; saved queries are
+    compiled once and reused on every run.
+    """
+    where, params = ["n.user_id = ?"], [USER]
+    for key, value, negated in parse(text):
+        sql, term_params = _compile_term(key, value)
+        where.append(f"NOT {sql}" if negated else sql)
+        params.extend(term_params)
+    sql = f"{_SELECT} WHERE {' AND '.join(where)} GROUP BY n.id ORDER BY n.timestamp DESC"
+    return sql, tuple(params)
+
+def bind(text, user_id):
+    """Returns the SQL and parameters for running `text` as `user_id`."""
+    sql, params = compile_query(text)
+    return sql, [user_id if p is USER else p for p in params]
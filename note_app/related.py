@@ -0,0 +1,244 @@
+"""
+Precomputed "related notes" index.
+
+Similarity combines tag overlap (Jaccard over each note's tag set) with the
+cosine of TF-IDF vectors over title and content. The index lives in the
+database: `note_vectors` holds each note's normalised vector, `note_terms`
+the same weights as postings keyed by term, and `term_stats` each user's
+document frequencies. Scoring a note reads only the postings of its top
+QUERY_TERMS terms and the `note_tags` rows of its own tags, so a write
+touches the notes it shares something with rather than the whole corpus.
+The top TOP_K neighbours of each note are stored in `related_notes`.
+
+All functions take an open connection and run inside the caller's
+transaction; `database` calls them whenever notes are written.
+"""
+import heapq
+import json
+import math
+import re
+from collections import Counter, defaultdict
+
+TOP_K = 5
+# Neighbours are found and scored through a note's most heavily weighted
+# terms only (as Lucene's MoreLikeThis does). Those tend to be rare, so the
+# postings read per write stay short however many notes share a common word.
+QUERY_TERMS = 25
+TAG_WEIGHT = 0.5
+TEXT_WEIGHT = 0.5
+MIN_SCORE = 0.05
+
+_WORD_RE = re.compile(r"[^\W\d_]{3,}")
+_STOPWORDS = frozenset("""
+    the and for are but not you all any can had her was one our out has him his how its may new now
+    see two who did get let say she too use that with have this will your from they been more were
+    when what some them than then into only also just over such like each which their there would
+    about other these those could should
+""".split())
+
+def term_counts(title, content):
+    words = _WORD_RE.findall(f"{title} {content}".lower())
+    return Counter(w for w in words if w not in _STOPWORDS)
+
+def _json_list(values):
+    # Passed to json_each() so a list of any length binds as one parameter.
+    return json.dumps(list(values), separators=(',', ':'))
+
+# --- Vectors ---
+
+def _load_vectors(conn, note_ids):
+    return {
+        row['note_id']: json.loads(row['terms'])
+        for row in conn.execute(
+            "SELECT note_id, terms FROM note_vectors WHERE note_id IN (SELECT value FROM json_each(?))",
+            (_json_list(note_ids),)
+        )
+    }
+
+def _count_documents(conn, user_id, terms, delta):
+    if delta > 0:
+        conn.executemany(
+            "INSERT INTO term_stats (user_id, term, df) VALUES (?, ?, 1) "
+            "ON CONFLICT (user_id, term) DO UPDATE SET df = df + 1",
+            [(user_id, term) for term in terms]
+        )
+    else:
+        conn.executemany("UPDATE term_stats SET df = df - 1 WHERE user_id = ? AND term = ?", [(user_id, term) for term in terms])
+        conn.execute(
+            "DELETE FROM term_stats WHERE user_id = ? AND df <= 0 AND term IN (SELECT value FROM json_each(?))",
+            (user_id, _json_list(terms))
+        )
+
+def _drop_vectors(conn, user_id, vectors):
+    """Removes stored vectors, their postings and their share of the document frequencies."""
+    for note_id, vector in vectors.items():
+        conn.executemany(
+            "DELETE FROM note_terms WHERE user_id = ? AND term = ? AND note_id = ?",
+            [(user_id, term, note_id) for term in vector]
+        )
+        _count_documents(conn, user_id, vector, -1)
+    conn.execute("DELETE FROM note_vectors WHERE note_id IN (SELECT value FROM json_each(?))", (_json_list(vectors),))
+
+def _store_vectors(conn, user_id, notes):
+    """
+    (Re)computes the vectors of `notes` (dicts with id, title, content) and
+    returns them by note id. Other notes keep the weights they were stored
+    with, so IDF drifts slightly as the corpus changes; `rebuild_index`
+    recomputes everything with current frequencies.
+    """
+    _drop_vectors(conn, user_id, _load_vectors(conn, [note['id'] for note in notes]))
+    counts = {note['id']: term_counts(note['title'], note['content']) for note in notes}
+    for terms in counts.values():
+        _count_documents(conn, user_id, terms, +1)
+
+    n = conn.execute("SELECT COUNT(*) FROM note_vectors WHERE user_id = ?", (user_id,)).fetchone()[0] + len(counts)
+    df = {
+        row['term']: row['df']
+        for row in conn.execute(
+            "SELECT term, df FROM term_stats WHERE user_id = ? AND term IN (SELECT value FROM json_each(?))",
+            (user_id, _json_list(set().union(*counts.values())))
+        )
+    }
+
+    vectors = {}
+    for note_id, terms in counts.items():
+        weights = {term: (1 + math.log(tf)) * (math.log((1 + n) / (1 + df[term])) + 1) for term, tf in terms.items()}
+        norm = math.sqrt(sum(w * w for w in weights.values())) or 1.0
+        vector = {term: w / norm for term, w in weights.items()}
+        conn.execute(
+            "INSERT INTO note_vectors (note_id, user_id, terms) VALUES (?, ?, ?)",
+            (note_id, user_id, json.dumps(vector, separators=(',', ':')))
+        )
+        conn.executemany(
+            "INSERT INTO note_terms (user_id, term, note_id, weight) VALUES (?, ?, ?, ?)",
+            [(user_id, term, note_id, w) for term, w in vector.items()]
+        )
+        vectors[note_id] = vector
+    return vectors
+
+# --- Scoring ---
+
+def scores(conn, user_id, note_id, vector):
+    """Returns {other_id: score} for every note sharing a query term or tag with `note_id`."""
+    query = dict(heapq.nlargest(QUERY_TERMS, vector.items(), key=lambda item: item[1]))
+    dots = {
+        row[0]: row[1]
+        for row in conn.execute(
+            "SELECT p.note_id, SUM(p.weight * q.value) FROM json_each(?) q "
+            "JOIN note_terms p ON p.user_id = ? AND p.term = q.key "
+            "WHERE p.note_id != ? GROUP BY p.note_id",
+            (json.dumps(query, separators=(',', ':')), user_id, note_id)
+        )
+    }
+
+    own_tags = conn.execute("SELECT COUNT(*) FROM note_tags WHERE note_id = ?", (note_id,)).fetchone()[0]
+    shared = {}
+    if own_tags:
+        shared = {
+            row[0]: (row[1], row[2])
+            for row in conn.execute(
+                "SELECT nt.note_id, COUNT(*), (SELECT COUNT(*) FROM note_tags s WHERE s.note_id = nt.note_id) "
+                "FROM note_tags nt WHERE nt.tag_id IN (SELECT tag_id FROM note_tags WHERE note_id = ?) AND nt.note_id != ? "
+                "GROUP BY nt.note_id",
+                (note_id, note_id)
+            )
+        }
+
+    result = {}
+    for other_id in dots.keys() | shared.keys():
+        jaccard = 0.0
+        if other_id in shared:
+            common, other_tags = shared[other_id]
+            jaccard = common / (own_tags + other_tags - common)
+        score = TAG_WEIGHT * jaccard + TEXT_WEIGHT * dots.get(other_id, 0.0)
+        if score >= MIN_SCORE:
+            result[other_id] = score
+    return result
+
+def _rescore(conn, user_id, note_id):
+    return scores(conn, user_id, note_id, _load_vectors(conn, [note_id]).get(note_id, {}))
+
+def _top_k(scores):
+    return heapq.nlargest(TOP_K, scores.items(), key=lambda item: item[1])
+
+def _replace_neighbours(conn, note_id, neighbours):
+    conn.execute("DELETE FROM related_notes WHERE note_id = ?", (note_id,))
+    conn.executemany(
+        "INSERT INTO related_notes (note_id, related_id, score) VALUES (?, ?, ?)",
+        [(note_id, related_id, score) for related_id, score in neighbours]
+    )
+
+def _stored_neighbours(conn, note_ids):
+    lists = defaultdict(dict)
+    for row in conn.execute(
+        "SELECT note_id, related_id, score FROM related_notes WHERE note_id IN (SELECT value FROM json_each(?))",
+        (_json_list(note_ids),)
+    ):
+        lists[row['note_id']][row['related_id']] = row['score']
+    return lists
+
+# --- Index Maintenance ---
+
+def index_notes(conn, notes, user_id):
+    """
+    Updates the index after `notes` (dicts with id, title, content) were created
+    or edited. Each changed note gets a fresh top-K, and only the lists of notes
+    that share a term or tag with a changed note, or currently list one, are
+    patched with the new scores.
+    """
+    vectors = _store_vectors(conn, user_id, notes)
+    changed = set(vectors)
+
+    affected = defaultdict(dict)
+    for note_id, vector in vectors.items():
+        note_scores = scores(conn, user_id, note_id, vector)
+        _replace_neighbours(conn, note_id, _top_k(note_scores))
+        for other_id, score in note_scores.items():
+            if other_id not in changed:
+                affected[other_id][note_id] = score
+    for row in conn.execute(
+        "SELECT note_id, related_id FROM related_notes WHERE related_id IN (SELECT value FROM json_each(?))",
+        (_json_list(changed),)
+    ):
+        if row['note_id'] not in changed:
+            affected[row['note_id']].setdefault(row['related_id'], None)
+
+    stored_lists = _stored_neighbours(conn, affected)
+    for other_id, updates in affected.items():
+        stored = stored_lists.get(other_id, {})
+        if any(note_id in stored and (score is None or score < stored[note_id]) for note_id, score in updates.items()):
+            # A stored neighbour got weaker, so a note outside the stored
+            # top-K may now rank higher; recompute this list.
+            neighbours = _rescore(conn, user_id, other_id)
+        else:
+            neighbours = dict(stored)
+            neighbours.update(updates)
+        top = _top_k(neighbours)
+        if dict(top) != stored:
+            _replace_neighbours(conn, other_id, top)
+
+def remove_notes(conn, note_ids, user_id):
+    """Drops deleted notes from the index and refills the lists they appeared in."""
+    if not note_ids: return
+    placeholders = ", ".join("?" for _ in note_ids)
+    affected = [
+        row['note_id'] for row in conn.execute(
+            f"SELECT DISTINCT note_id FROM related_notes WHERE related_id IN ({placeholders}) AND note_id NOT IN ({placeholders})",
+            [*note_ids, *note_ids]
+        )
+    ]
+    conn.execute(f"DELETE FROM related_notes WHERE note_id IN ({placeholders}) OR related_id IN ({placeholders})", [*note_ids, *note_ids])
+    _drop_vectors(conn, user_id, _load_vectors(conn, note_ids))
+    for note_id in affected:
+        _replace_neighbours(conn, note_id, _top_k(_rescore(conn, user_id, note_id)))
+
+def rebuild_index(conn, user_id, notes):
+    """Recomputes every vector, document frequency and neighbour list for a user from scratch."""
+    conn.execute("DELETE FROM note_vectors WHERE user_id = ?", (user_id,))
+    conn.execute("DELETE FROM note_terms WHERE user_id = ?", (user_id,))
+    conn.execute("DELETE FROM term_stats WHERE user_id = ?", (user_id,))
+    conn.execute("DELETE FROM related_notes WHERE note_id IN (SELECT id FROM notes WHERE user_id = ?)", (user_id,))
+    vectors = _store_vectors(conn, user_id, notes)
+    for note_id, vector in vectors.items():
+        _replace_neighbours(conn, note_id, _top_k(scores(conn, user_id, note_id, vector)))
+    return len(notes)
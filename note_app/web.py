@@ -1,5 +1,7 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash
-from . import database
+from flask import Flask, render_template, request, redirect, url_for, session, flash, g, send_from_directory
+from . import database, api, assets
+from .query import QueryError
+import mimetypes
 import markdown
 import os
 from functools import wraps
@@ -13,6 +15,9 @@ def create_app(test_config=None):
     app.config.from_mapping(
         SECRET_KEY=os.environ.get('SECRET_KEY', 'dev'), # Default to 'dev' if not set
         DATABASE=os.environ.get('DATABASE', os.path.join(app.instance_path, 'notes.db')),
+        API_MAX_BATCH=500,
+        WAL_ARCHIVE=os.environ.get('WAL_ARCHIVE') == '1',
+        SERVER_SESSIONS=os.environ.get('SERVER_SESSIONS') == '1',
     )
 
     if test_config is None:
@@ -22,6 +27,9 @@ def create_app(test_config=None):
         # load the test config if passed in
         app.config.from_mapping(test_config)
 
+    # Fingerprinted asset names from `python -m note_app assets`; empty until built.
+    app.config.setdefault('ASSET_MANIFEST', assets.load_manifest(app.static_folder))
+
     # ensure the instance folder exists
     try:
         os.makedirs(app.instance_path)
@@ -30,9 +38,42 @@ def create_app(test_config=None):
 
     # Set the database path for our database module
     database.DB_NAME = app.config['DATABASE']
+    database.WAL_AUTOCHECKPOINT = 0 if app.config['WAL_ARCHIVE'] else None
 
     app.jinja_env.add_extension('pypugjs.ext.jinja.PyPugJSExtension')
 
+    app.register_blueprint(api.bp)
+
+    @app.url_defaults
+    def hashed_static_url(endpoint, values):
+        """Makes url_for('static', ...) point at the fingerprinted copy, when one was built."""
+        if endpoint == 'static':
+            hashed = app.config['ASSET_MANIFEST'].get(values.get('filename'))
+            if hashed:
+                values['filename'] = f"{assets.DIST_DIR}/{hashed}"
+
+    @app.route('/static/dist/<path:filename>')
+    def static_dist(filename):
+        """Serves fingerprinted assets, pre-compressed if the client accepts it, as immutable."""
+        dist_dir = os.path.join(app.static_folder, assets.DIST_DIR)
+        mimetype = mimetypes.guess_type(filename)[0]
+        variants = [
+            (request.accept_encodings[encoding], encoding, suffix)
+            for encoding, suffix in (('br', '.br'), ('gzip', '.gz'))
+            if os.path.isfile(os.path.join(dist_dir, filename + suffix))
+        ]
+        # The client's highest quality wins (`gzip;q=0` refuses gzip); brotli on a tie.
+        quality, encoding, suffix = max(variants, key=lambda v: v[0], default=(0, None, None))
+        if quality > 0:
+            response = send_from_directory(dist_dir, filename + suffix, mimetype=mimetype)
+            response.headers['Content-Encoding'] = encoding
+        else:
+            response = send_from_directory(dist_dir, filename, mimetype=mimetype)
+        # The name changes whenever the content does, so browsers never need to revalidate.
+        response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+        response.vary.add('Accept-Encoding')
+        return response
+
     @app.template_filter('markdown')
     def markdown_filter(s):
         return markdown.markdown(s)
@@ -42,6 +83,13 @@ def create_app(test_config=None):
         def decorated_function(*args, **kwargs):
             if 'user_id' not in session:
                 return redirect(url_for('login'))
+            if app.config['SERVER_SESSIONS'] and not database.session_is_valid(session.get('sid'), session['user_id']):
+                session.clear()
+                return redirect(url_for('login'))
+            g.user = database.get_user(session['user_id'])
+            if g.user is None:
+                session.clear()
+                return redirect(url_for('login'))
             return f(*args, **kwargs)
         return decorated_function
 
@@ -73,8 +121,11 @@ def create_app(test_config=None):
             password = request.form['password']
             user = database.verify_password(username, password)
             if user:
+                session.clear()
                 session['user_id'] = user['id']
                 session['username'] = user['username']
+                if app.config['SERVER_SESSIONS']:
+                    session['sid'] = database.create_session(user['id'])
                 return redirect(url_for('index'))
             else:
                 flash("Invalid username or password.", "error")
@@ -83,6 +134,8 @@ def create_app(test_config=None):
 
     @app.route('/logout')
     def logout():
+        if app.config['SERVER_SESSIONS']:
+            database.delete_session(session.get('sid'))
         session.clear()
         return redirect(url_for('index'))
 
@@ -91,7 +144,8 @@ def create_app(test_config=None):
     def index():
         """Renders the home page with a list of recent notes."""
         notes = database.list_notes(session['user_id'])
-        return render_template('index.pug', notes=notes, title="All Notes")
+        saved_queries = database.list_saved_queries(session['user_id'])
+        return render_template('index.pug', notes=notes, saved_queries=saved_queries, title="All Notes")
 
     @app.route('/new', methods=['GET', 'POST'])
     @login_required
@@ -143,11 +197,49 @@ def create_app(test_config=None):
     def search():
         """Displays search results."""
         query = request.args.get('q', '')
-        if not query:
+        if not query.strip():
             return redirect(url_for('index'))
-        
-        notes = database.search_notes(query, session['user_id'])
-        return render_template('search_results.pug', notes=notes, query=query, title=f"Search Results for '{query}'")
+
+        try:
+            notes = database.query_notes(query, session['user_id'])
+        except QueryError as e:
+            flash(str(e), "error")
+            notes = []
+        return render_template('search_results.pug', notes=notes, query=query, can_save=True, title=f"Search Results for '{query}'")
+
+    @app.route('/search/save', methods=['POST'])
+    @login_required
+    def save_search():
+        """Saves the current search under a name."""
+        query = request.form.get('q', '')
+        name = request.form.get('name', '').strip()
+        if not query or not name:
+            flash("A name and a query are required to save a search.", "error")
+            return redirect(url_for('search', q=query) if query else url_for('index'))
+        try:
+            database.save_query(name, query, session['user_id'])
+        except QueryError as e:
+            flash(str(e), "error")
+            return redirect(url_for('search', q=query))
+        flash(f"Saved search '{name}'.", "success")
+        return redirect(url_for('search', q=query))
+
+    @app.route('/saved/<uuid:query_id>')
+    @login_required
+    def run_saved_search(query_id):
+        """Runs a saved search."""
+        saved = database.get_saved_query(str(query_id), session['user_id'])
+        if not saved:
+            return "Saved search not found.", 404
+        notes = database.query_notes(saved['query'], session['user_id'])
+        return render_template('search_results.pug', notes=notes, query=saved['query'], saved=saved, title=f"Saved Search: {saved['name']}")
+
+    @app.route('/saved/<uuid:query_id>/delete', methods=['POST'])
+    @login_required
+    def delete_saved_search(query_id):
+        """Deletes a saved search."""
+        database.delete_saved_query(str(query_id), session['user_id'])
+        return redirect(url_for('index'))
 
     @app.route('/delete/<uuid:note_id>', methods=['POST'])
     @login_required
@@ -173,7 +265,8 @@ def create_app(test_config=None):
         """Renders the page for a single note."""
         note = database.get_note(str(note_id), session['user_id'])
         if note:
-            return render_template('note.pug', note=note, title=note['title'])
+            related_notes = database.get_related_notes(note['id'], session['user_id'])
+            return render_template('note.pug', note=note, related_notes=related_notes, title=note['title'])
         else:
             return "Note not found or you don't have permission to view it.", 404
     return app
\ No newline at end of file
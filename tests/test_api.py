@@ -0,0 +1,120 @@
+import sys
+import pytest
+from note_app import cli, database
+
+@pytest.fixture
+def token(app):
+    """Creates a user and returns an API token for them."""
+    with app.app_context():
+        user_id = database.create_user("apiuser", "api@example.com", "password123")
+        return database.create_api_token(user_id)
+
+def auth(token):
+    return {'Authorization': f'Bearer {token}'}
+
+def test_missing_token_rejected(client):
+    """
+    Tests that API calls without a valid token are rejected.
+    """
+    response = client.post('/api/v1/notes/batch/fetch', json={'ids': []})
+    assert response.status_code == 401
+    response = client.post('/api/v1/notes/batch/fetch', json={'ids': []}, headers=auth('bogus'))
+    assert response.status_code == 401
+
+def test_batch_create_fetch_update_delete(client, token):
+    """
+    Tests the full batch lifecycle through the API.
+    """
+    response = client.post('/api/v1/notes/batch', headers=auth(token), json={'notes': [
+        {'title': 'One', 'content': 'First body', 'tags': 'a, b'},
+        {'title': 'Two', 'content': 'Second body', 'category': 'Work'},
+    ]})
+    assert response.status_code == 201
+    ids = response.get_json()['ids']
+    assert len(ids) == 2
+
+    # Field selection skips content
+    response = client.post('/api/v1/notes/batch/fetch?fields=id,title,tags', headers=auth(token), json={'ids': ids})
+    notes = response.get_json()['notes']
+    assert len(notes) == 2
+    assert all(set(n) == {'id', 'title', 'tags'} for n in notes)
+    assert b'": ' not in response.data
+
+    response = client.patch('/api/v1/notes/batch', headers=auth(token), json={'notes': [
+        {'id': ids[0], 'title': 'One (edited)'},
+        {'id': 'not-a-note', 'title': 'Ghost'},
+    ]})
+    assert response.get_json()['updated'] == [ids[0]]
+    note = client.get(f'/api/v1/notes/{ids[0]}', headers=auth(token)).get_json()
+    assert note['title'] == 'One (edited)'
+    assert note['content'] == 'First body'
+    assert 'a' in note['tags']
+
+    response = client.delete('/api/v1/notes/batch', headers=auth(token), json={'ids': ids})
+    assert sorted(response.get_json()['deleted']) == sorted(ids)
+    assert client.get(f'/api/v1/notes/{ids[0]}', headers=auth(token)).status_code == 404
+
+def test_batch_create_is_atomic(app, client, token):
+    """
+    Tests that an invalid note rejects the whole batch.
+    """
+    response = client.post('/api/v1/notes/batch', headers=auth(token), json={'notes': [
+        {'title': 'Good', 'content': 'Body'},
+        {'title': '', 'content': 'Body'},
+    ]})
+    assert response.status_code == 400
+    with app.app_context():
+        user = database.get_user_by_username("apiuser")
+        assert database.list_notes(user['id']) == []
+
+def test_batch_update_repeated_id(client, token):
+    """
+    Tests that two changes to the same note in one batch are both applied.
+    """
+    response = client.post('/api/v1/notes/batch', headers=auth(token), json={'notes': [
+        {'title': 'A', 'content': 'old'},
+    ]})
+    note_id = response.get_json()['ids'][0]
+
+    response = client.patch('/api/v1/notes/batch', headers=auth(token), json={'notes': [
+        {'id': note_id, 'title': 'B'},
+        {'id': note_id, 'content': 'new'},
+    ]})
+    assert response.get_json()['updated'] == [note_id]
+    note = client.get(f'/api/v1/notes/{note_id}', headers=auth(token)).get_json()
+    assert (note['title'], note['content']) == ('B', 'new')
+
+def test_invalid_note_types_rejected(client, token):
+    """
+    Tests that fields of the wrong type are rejected with a 400, not a server error.
+    """
+    response = client.post('/api/v1/notes/batch', headers=auth(token), json={'notes': [
+        {'title': 'One', 'content': 'Body'},
+    ]})
+    note_id = response.get_json()['ids'][0]
+
+    for bad in ({'tags': ['a', 'b']}, {'content': 5}, {'category': ['x']}, {'title': None}):
+        response = client.post('/api/v1/notes/batch', headers=auth(token), json={'notes': [
+            {'title': 'Two', 'content': 'Body', **bad},
+        ]})
+        assert response.status_code == 400, bad
+        response = client.patch('/api/v1/notes/batch', headers=auth(token), json={'notes': [{'id': note_id, **bad}]})
+        assert response.status_code == 400, bad
+        assert 'error' in response.get_json()
+
+def test_unknown_field_rejected(client, token):
+    """
+    Tests that asking for a field that does not exist is rejected.
+    """
+    response = client.post('/api/v1/notes/batch/fetch?fields=id,password', headers=auth(token), json={'ids': []})
+    assert response.status_code == 400
+
+def test_revoke_tokens_cli(app, client, token, monkeypatch, capsys):
+    """
+    Tests that --revoke-tokens invalidates the user's API tokens.
+    """
+    assert client.post('/api/v1/notes/batch/fetch', json={'ids': []}, headers=auth(token)).status_code == 200
+    monkeypatch.setattr(sys, 'argv', ['note_app', '--username', 'apiuser', '--revoke-tokens'])
+    cli.main()
+    assert "Revoked 1 API token(s)" in capsys.readouterr().out
+    assert client.post('/api/v1/notes/batch/fetch', json={'ids': []}, headers=auth(token)).status_code == 401
@@ -0,0 +1,79 @@
+import gzip
+import shutil
+from note_app import assets, web
+
+def _static_copy(tmp_path):
+    """Copies the real static files plus a fake vendored font into a temp dir."""
+    static_dir = tmp_path / "static"
+    shutil.copytree(assets.STATIC_DIR, static_dir, ignore=shutil.ignore_patterns(assets.DIST_DIR))
+    (static_dir / "vendor").mkdir(exist_ok=True)
+    (static_dir / "vendor" / "lato.woff2").write_bytes(b"font")
+    (static_dir / "vendor" / "fonts.css").write_text("@font-face { src: url(lato.woff2); }")
+    return static_dir
+
+def test_build_fingerprints_and_compresses(tmp_path):
+    """
+    Tests that the build writes hashed, pre-compressed files and rewrites CSS references.
+    """
+    static_dir = _static_copy(tmp_path)
+    manifest = assets.build(str(static_dir))
+    dist = static_dir / assets.DIST_DIR
+
+    hashed_css = manifest['selfnote.css']
+    assert hashed_css.startswith('selfnote.') and hashed_css != 'selfnote.css'
+    assert gzip.decompress((dist / (hashed_css + '.gz')).read_bytes()) == (dist / hashed_css).read_bytes()
+    assert not (dist / (manifest['selfnote.png'] + '.gz')).exists()
+
+    fonts_css = (dist / manifest['vendor/fonts.css']).read_text()
+    assert f"url({manifest['vendor/lato.woff2'].split('/')[-1]})" in fonts_css
+    assert assets.load_manifest(str(static_dir)) == manifest
+
+def test_hashed_urls_served_immutable(tmp_path):
+    """
+    Tests that url_for emits hashed URLs and that they are served compressed and cacheable.
+    """
+    static_dir = _static_copy(tmp_path)
+    manifest = assets.build(str(static_dir))
+    app = web.create_app({'TESTING': True, 'DATABASE': str(tmp_path / 'notes.db'), 'ASSET_MANIFEST': manifest})
+    app.static_folder = str(static_dir)
+    client = app.test_client()
+
+    response = client.get('/login')
+    assert f"/static/dist/{manifest['selfnote.css']}".encode() in response.data
+    assert b'fonts.googleapis.com' not in response.data
+
+    url = f"/static/dist/{manifest['selfnote.css']}"
+    response = client.get(url, headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.headers['Content-Type'].startswith('text/css')
+    assert 'immutable' in response.headers['Cache-Control']
+    assert gzip.decompress(response.data) == (static_dir / assets.DIST_DIR / manifest['selfnote.css']).read_bytes()
+    response.close()
+
+    response = client.get(url)
+    assert 'Content-Encoding' not in response.headers
+    response.close()
+
+def test_encoding_follows_accept_quality(tmp_path):
+    """
+    Tests that a refused encoding (q=0) is never sent and the preferred variant is.
+    """
+    static_dir = _static_copy(tmp_path)
+    manifest = assets.build(str(static_dir))
+    dist = static_dir / assets.DIST_DIR
+    (dist / (manifest['selfnote.css'] + '.br')).write_bytes(b"brotli")
+    app = web.create_app({'TESTING': True, 'DATABASE': str(tmp_path / 'notes.db'), 'ASSET_MANIFEST': manifest})
+    app.static_folder = str(static_dir)
+    client = app.test_client()
+    url = f"/static/dist/{manifest['selfnote.css']}"
+
+    for accept, expected in [
+        ('gzip;q=0', None),
+        ('br;q=0, gzip;q=0', None),
+        ('br;q=0, gzip', 'gzip'),
+        ('br;q=0.5, gzip;q=1.0', 'gzip'),
+        ('gzip, br', 'br'),
+    ]:
+        response = client.get(url, headers={'Accept-Encoding': accept})
+        assert response.headers.get('Content-Encoding') == expected, accept
+        response.close()
@@ -0,0 +1,123 @@
+import os
+import threading
+import time
+import pytest
+from datetime import datetime, timedelta
+from note_app import backup, database
+
+@pytest.fixture
+def user_id(app):
+    with app.app_context():
+        return database.create_user("testuser", "test@example.com", "password123")
+
+def _titles(db_path, user_id):
+    old_name = database.DB_NAME
+    database.DB_NAME = db_path
+    try:
+        return sorted(n['title'] for n in database.list_notes(user_id))
+    finally:
+        database.DB_NAME = old_name
+
+def test_snapshot_and_restore(app, user_id, tmp_path):
+    """
+    Tests that a snapshot can be restored and is verified against its manifest.
+    """
+    database.add_note("Before", "Content", None, None, user_id)
+    path = backup.snapshot(database.DB_NAME, str(tmp_path), pages=1, pause=0)
+    assert backup._read_manifest(path)['counts']['notes'] == 1
+
+    database.add_note("After", "Content", None, None, user_id)
+    target = str(tmp_path / "restored.db")
+    manifest = backup.restore(str(tmp_path), target)
+    assert manifest['counts']['notes'] == 1
+    assert _titles(target, user_id) == ["Before"]
+
+    with pytest.raises(FileExistsError):
+        backup.restore(str(tmp_path), target)
+
+def test_snapshot_retention(app, tmp_path, monkeypatch):
+    """
+    Tests that only the newest snapshots are kept, that names never collide and that keep must be positive.
+    """
+    start = datetime(2025, 1, 1)
+    for i in range(4):
+        monkeypatch.setattr(backup, '_now', lambda i=i: start + timedelta(minutes=i))
+        backup.snapshot(database.DB_NAME, str(tmp_path), keep=2, pause=0)
+    snapshots = sorted(os.listdir(tmp_path / "snapshots"))
+    assert snapshots == [
+        "notes-20250101T000200000000.db", "notes-20250101T000200000000.db.json",
+        "notes-20250101T000300000000.db", "notes-20250101T000300000000.db.json",
+    ]
+
+    # Two snapshots in the same second are both kept
+    monkeypatch.setattr(backup, '_now', lambda: start + timedelta(minutes=5, microseconds=1))
+    backup.snapshot(database.DB_NAME, str(tmp_path), keep=3, pause=0)
+    monkeypatch.setattr(backup, '_now', lambda: start + timedelta(minutes=5, microseconds=2))
+    backup.snapshot(database.DB_NAME, str(tmp_path), keep=3, pause=0)
+    assert len(os.listdir(tmp_path / "snapshots")) == 6
+
+    with pytest.raises(ValueError):
+        backup.snapshot(database.DB_NAME, str(tmp_path), keep=0)
+    with pytest.raises(SystemExit):
+        backup.main(["snapshot", "--dest", str(tmp_path), "--keep", "0"])
+    assert len(os.listdir(tmp_path / "snapshots")) == 6
+
+def test_wal_archive_point_in_time_restore(app, user_id, tmp_path, monkeypatch):
+    """
+    Tests that archived WAL segments restore the database as of a given time.
+    """
+    monkeypatch.setattr(database, 'WAL_AUTOCHECKPOINT', 0)
+    clock = [datetime(2025, 1, 1, 12, 0, 0)]
+    monkeypatch.setattr(backup, '_now', lambda: clock[0])
+
+    archiver = backup.WalArchiver(database.DB_NAME, str(tmp_path))
+    try:
+        archiver.start_chain()
+        for minute, title in enumerate(["One", "Two", "Three"], start=1):
+            database.add_note(title, "Content", None, None, user_id)
+            clock[0] = datetime(2025, 1, 1, 12, minute, 0)
+            assert archiver.archive() is not None
+        assert archiver.archive() is None
+    finally:
+        archiver.close()
+
+    target = str(tmp_path / "restored.db")
+    backup.restore(str(tmp_path), target, at=datetime(2025, 1, 1, 12, 2, 30))
+    assert _titles(target, user_id) == ["One", "Two"]
+
+    backup.restore(str(tmp_path), target, force=True)
+    assert _titles(target, user_id) == ["One", "Three", "Two"]
+
+    backup.restore(str(tmp_path), target, at=datetime(2025, 1, 1, 12, 0, 0), force=True)
+    assert _titles(target, user_id) == []
+
+def test_snapshot_completes_under_concurrent_writes(app, user_id, tmp_path):
+    """
+    Tests that a batched snapshot finishes while another connection keeps writing.
+    """
+    database.add_notes([{'title': f"Seed {i}", 'content': "Seed content " * 100} for i in range(100)], user_id)
+    db_path = database.DB_NAME
+    stop = threading.Event()
+    written = []
+
+    def writer():
+        deadline = time.monotonic() + 30
+        while not stop.is_set() and time.monotonic() < deadline:
+            written.append(database.add_note(f"Live {len(written)}", "Content", None, None, user_id))
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    try:
+        while len(written) < 2:
+            time.sleep(0.01)
+        path = backup.snapshot(db_path, str(tmp_path), pages=1, pause=0.005)
+        # Without a pinned read transaction every write restarts the copy and
+        # the snapshot only finishes once the writer gives up.
+        assert thread.is_alive()
+    finally:
+        stop.set()
+        thread.join()
+
+    manifest = backup._read_manifest(path)
+    assert 100 + 2 <= manifest['counts']['notes'] <= 100 + len(written)
+    assert backup.verify(path, manifest['counts']) == []
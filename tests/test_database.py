@@ -1,6 +1,8 @@
 
 import pytest
+from werkzeug.security import generate_password_hash
 from note_app import database
+from note_app.cache import TTLCache
 
 def test_create_user(app):
     """
@@ -61,3 +63,162 @@ def test_note_isolation(app):
         assert len(user1_notes) == 1
         assert user1_notes[0]['title'] == "User 1's Note"
         assert len(user2_notes) == 0
+
+def _term_stats():
+    conn = database.get_db_conn()
+    rows = sorted(tuple(row) for row in conn.execute("SELECT term, df FROM term_stats"))
+    conn.close()
+    return rows
+
+def test_related_notes_index(app):
+    """
+    Tests that related notes are precomputed and kept up to date on write.
+    """
+    with app.app_context():
+        user_id = database.create_user("testuser", "test@example.com", "password123")
+        python_id = database.add_note("Python packaging", "Wheels and virtualenvs for python projects", None, "python, tooling", user_id)
+        pip_id = database.add_note("Pip tips", "Installing python wheels inside virtualenvs", None, "python", user_id)
+        bread_id = database.add_note("Sourdough", "Flour water salt starter", None, "baking", user_id)
+
+        related = [n['id'] for n in database.get_related_notes(python_id, user_id)]
+        assert related == [pip_id]
+        assert [n['id'] for n in database.get_related_notes(pip_id, user_id)] == [python_id]
+        assert database.get_related_notes(bread_id, user_id) == []
+
+        # Editing a note into the same topic makes it show up for the others
+        database.update_note(bread_id, "Python baking", "Baking wheels with python virtualenvs", None, "python", user_id)
+        assert bread_id in [n['id'] for n in database.get_related_notes(python_id, user_id)]
+
+        # Deleting removes it from every list
+        database.delete_note(pip_id, user_id)
+        assert pip_id not in [n['id'] for n in database.get_related_notes(python_id, user_id)]
+
+        # The incremental result, including the stored document frequencies, matches a full rebuild
+        before, df_before = database.get_related_notes(python_id, user_id), _term_stats()
+        assert database.rebuild_related_index(user_id) == 2
+        assert [n['id'] for n in database.get_related_notes(python_id, user_id)] == [n['id'] for n in before]
+        assert _term_stats() == df_before
+
+def test_large_content_is_compressed(app):
+    """
+    Tests that large note bodies are stored compressed but read and searched as text.
+    """
+    with app.app_context():
+        user_id = database.create_user("testuser", "test@example.com", "password123")
+        body = "log line with needle-42 inside\n" * 1000
+        note_id = database.add_note("Big log", body, None, None, user_id)
+
+        conn = database.get_db_conn()
+        stored = conn.execute("SELECT b.content, n.excerpt FROM notes n JOIN note_bodies b ON b.note_id = n.id WHERE n.id = ?", (note_id,)).fetchone()
+        conn.close()
+        assert isinstance(stored['content'], bytes)
+        assert len(stored['content']) < len(body) / 10
+        assert stored['excerpt'] == body[:database.EXCERPT_LENGTH]
+
+        assert database.get_note(note_id, user_id)['content'] == body
+        assert [n['id'] for n in database.query_notes("needle-42", user_id)] == [note_id]
+        assert 'content' not in database.list_notes(user_id)[0]
+
+def test_compact_database(app):
+    """
+    Tests that compaction recompresses rows stored as plain text.
+    """
+    with app.app_context():
+        user_id = database.create_user("testuser", "test@example.com", "password123")
+        body = "repetitive " * 2000
+        note_id = database.add_note("Old note", "placeholder", None, None, user_id)
+        conn = database.get_db_conn()
+        with conn:
+            conn.execute("UPDATE note_bodies SET content = ? WHERE note_id = ?", (body, note_id))
+        conn.close()
+
+        before, after, rewritten = database.compact_database()
+        assert rewritten == 1
+        assert after <= before
+        assert database.get_note(note_id, user_id)['content'] == body
+
+def test_bodies_moved_out_of_notes(app):
+    """
+    Tests that bodies stored in notes.content by older versions move to note_bodies on setup.
+    """
+    with app.app_context():
+        user_id = database.create_user("testuser", "test@example.com", "password123")
+        note_id = database.add_note("Old note", "Body from before", None, None, user_id)
+        conn = database.get_db_conn()
+        with conn:
+            conn.execute("ALTER TABLE notes ADD COLUMN content TEXT")
+            conn.execute("UPDATE notes SET content = (SELECT content FROM note_bodies WHERE note_id = notes.id)")
+            conn.execute("DELETE FROM note_bodies")
+        conn.close()
+
+        database.setup_database()
+        conn = database.get_db_conn()
+        columns = [row['name'] for row in conn.execute("PRAGMA table_info(notes)")]
+        conn.close()
+        assert 'content' not in columns
+        assert database.get_note(note_id, user_id)['content'] == "Body from before"
+
+def _set_user_column(user_id, column, value):
+    conn = database.get_db_conn()
+    with conn:
+        conn.execute(f"UPDATE users SET {column} = ? WHERE id = ?", (value, user_id))
+    conn.close()
+
+def test_user_cache(app, monkeypatch):
+    """
+    Tests that user lookups are cached for USER_CACHE.ttl seconds without the password hash.
+    """
+    now = [0.0]
+    monkeypatch.setattr(database, 'USER_CACHE', TTLCache(maxsize=16, ttl=300, timer=lambda: now[0]))
+    with app.app_context():
+        user_id = database.create_user("testuser", "test@example.com", "password123")
+        user = database.get_user_by_username("testuser")
+        assert user == {'id': user_id, 'username': "testuser", 'email': "test@example.com"}
+
+        # A change made behind the cache's back is only seen once the entry expires
+        _set_user_column(user_id, 'email', "new@example.com")
+        assert database.get_user(user_id)['email'] == "test@example.com"
+        now[0] = 301
+        assert database.get_user(user_id)['email'] == "new@example.com"
+
+        # Passwords are always checked against the database, never the cache
+        _set_user_column(user_id, 'password', generate_password_hash("newpass"))
+        assert database.verify_password("testuser", "newpass") == database.get_user(user_id)
+        assert database.verify_password("testuser", "password123") is None
+
+def test_sessions_expire(app):
+    """
+    Tests that sessions older than SESSION_LIFETIME are rejected and pruned at the next login.
+    """
+    with app.app_context():
+        user_id = database.create_user("testuser", "test@example.com", "password123")
+        old = database.create_session(user_id)
+        assert database.session_is_valid(old, user_id)
+
+        conn = database.get_db_conn()
+        with conn:
+            conn.execute("UPDATE sessions SET created = '2000-01-01 00:00:00'")
+        conn.close()
+        database.SESSION_CACHE.clear()
+        assert not database.session_is_valid(old, user_id)
+
+        new = database.create_session(user_id)
+        assert database.session_is_valid(new, user_id)
+        conn = database.get_db_conn()
+        assert conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0] == 1
+        conn.close()
+
+def test_ttl_cache_expiry_and_eviction():
+    """
+    Tests that entries expire after the TTL and the least recently used one is evicted when full.
+    """
+    now = [0.0]
+    cache = TTLCache(maxsize=2, ttl=10, timer=lambda: now[0])
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)  # evicts 'b', the least recently used
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    now[0] = 11
+    assert cache.get('a') is None
@@ -0,0 +1,94 @@
+import pytest
+from note_app import database, query
+
+def test_parse():
+    """
+    Tests splitting a query into filter, phrase, negated and URL terms, and rejecting bad dates.
+    """
+    terms = query.parse('tag:a TAG:"web dev" category:x "exact phrase" -draft http://example.com after:2025-01-01')
+    assert terms == [
+        ('tag', 'a', False),
+        ('tag', 'web dev', False),
+        ('category', 'x', False),
+        (None, 'exact phrase', False),
+        (None, 'draft', True),
+        (None, 'http://example.com', False),
+        ('after', '2025-01-01', False),
+    ]
+    with pytest.raises(query.QueryError):
+        query.parse('before:yesterday')
+
+def test_parse_rejects_query_without_terms():
+    """
+    Tests that non-blank text made only of empty terms is an error rather than a match-everything query.
+    """
+    assert query.parse('') == []
+    assert query.parse('  ') == []
+    for text in ('""', 'tag:""', '-"', 'category:"" ""'):
+        with pytest.raises(query.QueryError):
+            query.parse(text)
+
+def test_compile_is_single_parameterized_statement():
+    """
+    Tests that a query compiles to one statement with every value bound as a parameter.
+    """
+    sql, params = query.bind('tag:a category:x "50%" after:2025-01-01', 'user-1')
+    assert sql.count('SELECT') == 4  # the outer query plus one subquery per tag/category/word filter
+    assert '50' not in sql and 'user-1' not in sql
+    assert params.count('user-1') == 3
+    assert '%50\\%%' in params
+
+def _note(title, content, category, tags, user_id, timestamp):
+    note_id = database.add_note(title, content, category, tags, user_id)
+    conn = database.get_db_conn()
+    with conn:
+        conn.execute("UPDATE notes SET timestamp = ? WHERE id = ?", (timestamp, note_id))
+    conn.close()
+    return note_id
+
+def test_query_notes(app):
+    """
+    Tests combined tag, category, phrase and date filters in one query.
+    """
+    with app.app_context():
+        user_id = database.create_user("testuser", "test@example.com", "password123")
+        other_id = database.create_user("other", "other@example.com", "password123")
+        flask_id = _note("Flask tips", "Blueprints are neat", "Work/Projects", "python, web", user_id, "2025-03-01 10:00:00")
+        django_id = _note("Django notes", "Blueprints are not a thing here", "Work", "python", user_id, "2024-06-01 10:00:00")
+        bread_id = _note("Bread", "Flour water salt", "Personal", "baking", user_id, "2025-04-01 10:00:00")
+        _note("Flask tips", "Blueprints are neat", "Work", "python, web", other_id, "2025-03-01 10:00:00")
+
+        ids = lambda q: [n['id'] for n in database.query_notes(q, user_id)]
+        assert ids('tag:python') == [flask_id, django_id]
+        assert ids('tag:python tag:web') == [flask_id]
+        assert ids('category:Work') == [flask_id, django_id]  # includes the Work/Projects child
+        assert ids('category:Work/Projects') == [flask_id]
+        assert ids('"are neat"') == [flask_id]
+        assert ids('tag:python after:2025-01-01') == [flask_id]
+        assert ids('before:2025-01-01') == [django_id]
+        assert ids('-category:Work') == [bread_id]
+        assert ids('-tag:python') == [bread_id]
+        assert ids('') == [bread_id, flask_id, django_id]
+
+        # Tags are still listed in full when filtering on one of them
+        assert database.query_notes('tag:web', user_id)[0]['tags'].count(',') == 1
+
+def test_saved_queries(app):
+    """
+    Tests saving, running and deleting queries, and that compiled plans are reused.
+    """
+    with app.app_context():
+        user_id = database.create_user("testuser", "test@example.com", "password123")
+        note_id = database.add_note("Flask tips", "Content", "Work", "python", user_id)
+        query_id = database.save_query("work python", "tag:python category:Work", user_id)
+        with pytest.raises(query.QueryError):
+            database.save_query("bad", "after:soon", user_id)
+
+        saved = database.get_saved_query_by_name("work python", user_id)
+        assert saved['id'] == query_id
+        hits = query.compile_query.cache_info().hits
+        assert [n['id'] for n in database.query_notes(saved['query'], user_id)] == [note_id]
+        assert query.compile_query.cache_info().hits > hits
+
+        database.delete_saved_query(query_id, user_id)
+        assert database.list_saved_queries(user_id) == []
@@ -74,3 +74,46 @@ def test_logged_in_access(client):
     response = client.get('/', follow_redirects=True)
     assert response.status_code == 200
     assert b'All Notes' in response.data
+
+def test_server_session_revocation(app, client):
+    """
+    Tests that revoking server-side sessions logs the user out.
+    """
+    app.config['SERVER_SESSIONS'] = True
+    client.post('/register', data={'username': 'test', 'email': 'test@test.com', 'password': 'pw'})
+    client.post('/login', data={'username': 'test', 'password': 'pw'})
+    assert client.get('/').status_code == 200
+
+    with app.app_context():
+        user = database.get_user_by_username('test')
+        assert database.revoke_sessions(user['id']) == 1
+
+    response = client.get('/')
+    assert response.status_code == 302
+    assert 'login' in response.headers['Location']
+
+def test_search_query_language_and_saved_search(client):
+    """
+    Tests that /search accepts the query language and that searches can be saved.
+    """
+    client.post('/register', data={'username': 'test', 'email': 'test@test.com', 'password': 'pw'})
+    client.post('/login', data={'username': 'test', 'password': 'pw'})
+    client.post('/new', data={'title': 'Flask tips', 'content': 'Body', 'category': 'Work', 'tags': 'python'})
+    client.post('/new', data={'title': 'Bread', 'content': 'Body', 'category': 'Home', 'tags': 'baking'})
+
+    response = client.get('/search', query_string={'q': 'tag:python category:Work'})
+    assert b'Flask tips' in response.data
+    assert b'Bread' not in response.data
+
+    response = client.get('/search', query_string={'q': 'after:someday'})
+    assert b'expects a date' in response.data
+
+    client.post('/search/save', data={'q': 'tag:python', 'name': 'Python'})
+    response = client.get('/')
+    assert b'Saved Searches' in response.data
+    with client.application.app_context():
+        user = database.get_user_by_username('test')
+        saved = database.get_saved_query_by_name('Python', user['id'])
+    response = client.get(f"/saved/{saved['id']}")
+    assert b'Flask tips' in response.data
+    assert b'Bread' not in response.data